@@ -0,0 +1,220 @@
+"""Reproducible throughput benchmark for the image converter.
+
+Generates deterministic synthetic images (several sizes and modes) in every
+source format, converts each one to every target format and records files/s,
+MB/s, peak RSS and per-stage timings (open, decode, convert, encode, write).
+Results go to JSON; pass --compare to diff against an earlier run.
+
+Example:
+    python benchmark.py -o bench.json
+    python benchmark.py --sizes 256x256 --repeat 5 --compare bench.json
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import PIL
+from PIL import Image
+
+from converter_engine import FORMATS, ConvertOptions, Throughput, convert_file, iter_convert
+from encoder_profiles import DEFAULT_PROFILE, PROFILES, pil_format
+from pipeline_stats import STAGES, StageStats
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SIZES = ['256x256', '1024x768', '3000x2000']
+MODES = ['RGB', 'RGBA', 'L', 'P']
+
+
+def synthetic_image(size, mode):
+    """Deterministic test image with smooth and detailed regions."""
+    detail = Image.effect_mandelbrot(size, (-2.0, -1.2, 0.8, 1.2), 64)
+    horizontal = Image.linear_gradient('L').rotate(90).resize(size)
+    radial = Image.radial_gradient('L').resize(size)
+    img = Image.merge('RGB', (detail, horizontal, radial))
+    if mode == 'RGBA':
+        img.putalpha(Image.linear_gradient('L').resize(size))
+    elif mode == 'L':
+        img = img.convert('L')
+    elif mode == 'P':
+        img = img.quantize(256)
+    return img
+
+
+def write_source(img, folder, fmt):
+    """Save img as a source file in fmt; returns the path or None if the codec refuses the mode."""
+    # The format is in the stem too: batch outputs are named after it and would collide
+    path = Path(folder) / f"src_{img.mode}_{img.width}x{img.height}_{fmt.lower()}.{fmt.lower()}"
+    if fmt in ['JPG', 'JPEG'] and img.mode not in ('RGB', 'L'):
+        return None
+    try:
+        img.save(path, pil_format(fmt))
+    except (OSError, ValueError, KeyError):
+        return None
+    return path
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_case(source, target, profile, repeat):
+    """Convert source to target repeat times, timing each stage. Runs in a fresh process."""
+    options = ConvertOptions(profile=profile)
+    timings = {stage: [] for stage in STAGES + ('total',)}
+    bytes_out = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = Path(tmp) / f"out.{target.lower()}"
+        for _ in range(repeat):
+            stats = StageStats()
+            start = time.perf_counter()
+            convert_file(source, target, output_path, options, stats)
+            timings['total'].append(time.perf_counter() - start)
+            for stage in STAGES:
+                timings[stage].append(stats.seconds[stage])
+            bytes_out = stats.bytes_out
+
+    median = {stage: statistics.median(values) for stage, values in timings.items()}
+    bytes_in = os.path.getsize(source)
+    return {
+        'stages_ms': {stage: round(seconds * 1000, 3) for stage, seconds in median.items()},
+        'files_per_s': round(1 / median['total'], 2) if median['total'] else None,
+        'mb_per_s': round(bytes_in / median['total'] / (1024 * 1024), 2) if median['total'] else None,
+        'bytes_in': bytes_in,
+        'bytes_out': bytes_out,
+        'peak_rss_mb': round(peak_rss_mb(), 1) if resource is not None else None,
+    }
+
+
+def run_batch(sources, target, profile, workers):
+    """Time the parallel batch path over every generated source for one target."""
+    with tempfile.TemporaryDirectory() as tmp:
+        throughput = Throughput()
+        failures = 0
+        for result in iter_convert(sources, target, tmp, workers, options=ConvertOptions(profile=profile)):
+            throughput.add(result)
+            failures += result.error is not None
+        files_per_s, mb_per_s = throughput.rates()
+    return {'target': target, 'files': throughput.files, 'failures': failures,
+            'files_per_s': round(files_per_s, 2), 'mb_per_s': round(mb_per_s, 2)}
+
+
+def parse_size(text):
+    width, height = (int(part) for part in text.lower().split('x', 1))
+    return width, height
+
+
+def case_key(case):
+    return (case['source_format'], case['target'], case['mode'], case['size'])
+
+
+def compare(results, baseline_path):
+    """Print files/s change per case against an earlier results file."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {case_key(case): case for case in json.load(f)['cases']}
+    print(f"\n{'case':<40} {'old f/s':>9} {'new f/s':>9} {'change':>8}")
+    for case in results['cases']:
+        old = baseline.get(case_key(case))
+        if not old or not old.get('files_per_s') or not case.get('files_per_s'):
+            continue
+        change = case['files_per_s'] / old['files_per_s'] - 1
+        label = f"{case['source_format']}->{case['target']} {case['mode']} {case['size']}"
+        print(f"{label:<40} {old['files_per_s']:>9.2f} {case['files_per_s']:>9.2f} {change:>+8.1%}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark image conversion throughput.")
+    parser.add_argument('--sizes', nargs='+', default=DEFAULT_SIZES, help="image sizes, e.g. 1024x768")
+    parser.add_argument('--modes', nargs='+', default=MODES, choices=MODES, help="source image modes")
+    parser.add_argument('--sources', nargs='+', type=str.upper, default=FORMATS, choices=FORMATS,
+                        help="source formats")
+    parser.add_argument('--targets', nargs='+', type=str.upper, default=FORMATS, choices=FORMATS,
+                        help="target formats")
+    parser.add_argument('--profile', choices=PROFILES, default=DEFAULT_PROFILE, help="encoder profile")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per case; the median is reported")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="workers for the batch throughput pass")
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help="JSON results file")
+    parser.add_argument('--compare', help="earlier results file to compare against")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sizes = [parse_size(size) for size in args.sizes]
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'pillow': PIL.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'profile': args.profile,
+            'repeat': args.repeat,
+        },
+        'cases': [],
+        'batch': [],
+    }
+
+    with tempfile.TemporaryDirectory() as source_dir:
+        sources = []
+        for size in sizes:
+            for mode in args.modes:
+                img = synthetic_image(size, mode)
+                for fmt in args.sources:
+                    path = write_source(img, source_dir, fmt)
+                    if path is not None:
+                        sources.append((fmt, mode, size, path))
+
+        # One fresh process per case so peak RSS belongs to that case alone
+        with ProcessPoolExecutor(max_workers=1, max_tasks_per_child=1) as executor:
+            for fmt, mode, size, path in sources:
+                for target in args.targets:
+                    case = {'source_format': fmt, 'target': target, 'mode': mode,
+                            'size': f"{size[0]}x{size[1]}"}
+                    try:
+                        case.update(executor.submit(run_case, str(path), target, args.profile,
+                                                    args.repeat).result())
+                    except Exception as e:
+                        case['error'] = str(e)
+                    results['cases'].append(case)
+                    label = f"{fmt}->{target} {mode} {case['size']}"
+                    print(f"{label:<40} {case.get('files_per_s', 'error')!s:>9} files/s  "
+                          f"{case.get('stages_ms', {}).get('total', '')} ms")
+
+        source_paths = [str(path) for _, _, _, path in sources]
+        for target in args.targets:
+            batch = run_batch(source_paths, target, args.profile, args.jobs)
+            results['batch'].append(batch)
+            print(f"batch ->{target:<5} {batch['files_per_s']:>8} files/s {batch['mb_per_s']:>8} MB/s "
+                  f"({batch['failures']} failed)")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
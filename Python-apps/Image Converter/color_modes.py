@@ -0,0 +1,190 @@
+"""Colour-mode normalization: bring any decoded frame into a mode the target encoder writes.
+
+Alpha is composited onto a matte colour, palettes are expanded, 16-bit and
+float samples are scaled to 8 bits, and CMYK becomes RGB. Each step runs
+over the whole buffer at once with NumPy when it is installed and falls
+back to Pillow's own converters otherwise.
+"""
+from PIL import Image, ImageColor
+
+from encoder_profiles import pil_format
+
+try:
+    import numpy as np
+except ImportError:  # optional; Pillow does the same work a little slower
+    np = None
+
+DEFAULT_MATTE = (255, 255, 255)
+
+# Modes each encoder writes faithfully; anything else is normalized first.
+# Pillow accepts more (e.g. I;16 as WEBP), but clips or misreads them.
+ENCODER_MODES = {
+    'JPEG': {'1', 'L', 'RGB'},
+    'PNG': {'1', 'L', 'LA', 'P', 'RGB', 'RGBA', 'I;16'},
+    'GIF': {'1', 'L', 'P', 'RGB', 'RGBA'},
+    'BMP': {'1', 'L', 'P', 'RGB', 'RGBA'},
+    'TIFF': {'1', 'L', 'LA', 'P', 'RGB', 'RGBA', 'CMYK', 'I;16', 'I', 'F'},
+    'WEBP': {'RGB', 'RGBA'},
+    'ICO': {'1', 'L', 'LA', 'P', 'RGB', 'RGBA'},
+}
+
+DEEP_MODES = ('I;16', 'I;16L', 'I;16B', 'I;16N', 'I', 'F')
+
+
+def parse_matte(spec):
+    """Parse a matte colour ('white', '#202020', 'rgb(0,0,0)') into an RGB tuple."""
+    try:
+        return ImageColor.getrgb(str(spec).strip())[:3]
+    except ValueError:
+        raise ValueError(f"Invalid matte colour '{spec}': use a name like white or a hex code like #ffffff")
+
+
+def needs_normalizing(mode, output_format):
+    """True when a frame in this mode cannot go to the encoder as it is."""
+    accepted = ENCODER_MODES.get(pil_format(output_format))
+    return accepted is not None and mode not in accepted
+
+
+def normalized_mode(mode, output_format, matte=DEFAULT_MATTE, expand_palette=False):
+    """The mode normalize() turns a frame of this mode into, without touching pixels.
+
+    Palettes are taken to have transparency, so their estimate errs large.
+    """
+    accepted = ENCODER_MODES.get(pil_format(output_format))
+    if accepted is None or mode in accepted and not (expand_palette and mode == 'P'):
+        return mode
+    if mode in ('P', 'PA'):
+        mode = 'RGBA'
+    elif mode in DEEP_MODES:
+        mode = 'I;16' if 'I;16' in accepted else 'L'
+    elif mode == 'CMYK':
+        mode = 'RGB'
+    elif mode in ('RGBa', 'La'):
+        mode = mode.upper()
+
+    if mode in accepted:
+        return mode
+    if mode in ('LA', 'RGBA'):
+        if 'RGBA' in accepted:
+            return 'RGBA'
+        return 'L' if mode == 'LA' and matte[0] == matte[1] == matte[2] else 'RGB'
+    return 'RGB'
+
+
+def normalize(img, output_format, matte=DEFAULT_MATTE, expand_palette=False):
+    """Return img in a mode the output_format encoder writes correctly.
+
+    Transparent pixels are composited onto matte for targets without alpha.
+    With expand_palette, palette images are expanded even when the target
+    takes them (resampling needs real colours).
+    """
+    accepted = ENCODER_MODES.get(pil_format(output_format))
+    if accepted is None or img.mode in accepted and not (expand_palette and img.mode == 'P'):
+        return img
+    keep_alpha = 'RGBA' in accepted
+
+    if img.mode in ('P', 'PA'):
+        img = palette_to_rgb(img)
+    elif img.mode in DEEP_MODES:
+        img = to_16bit(img) if 'I;16' in accepted else to_8bit(img)
+    elif img.mode == 'CMYK':
+        img = cmyk_to_rgb(img)
+    elif img.mode in ('RGBa', 'La'):
+        img = img.convert(img.mode.upper())  # un-premultiply
+
+    if img.mode in accepted:
+        return img
+    if img.mode in ('LA', 'RGBA'):
+        return img.convert('RGBA') if keep_alpha else composite(img, matte)
+    return img.convert('RGB')
+
+
+def palette_to_rgb(img):
+    """Expand a palette image to RGB, or RGBA when it has transparency."""
+    transparency = img.info.get('transparency')
+    if np is None or img.mode != 'P' or img.palette.mode != 'RGB':
+        return img.convert('RGBA' if transparency is not None or img.mode == 'PA' else 'RGB')
+
+    palette = np.zeros((256, 4), dtype=np.uint8)
+    palette[:, 3] = 255
+    colours = np.frombuffer(bytes(img.getpalette()), dtype=np.uint8).reshape(-1, 3)[:256]
+    palette[:len(colours), :3] = colours
+    if isinstance(transparency, int):
+        palette[transparency, 3] = 0
+    elif isinstance(transparency, bytes):
+        alpha = np.frombuffer(transparency, dtype=np.uint8)[:256]
+        palette[:len(alpha), 3] = alpha
+
+    # One table lookup for the whole buffer
+    indices = np.asarray(img)
+    if transparency is None:
+        return Image.fromarray(np.ascontiguousarray(palette[:, :3])[indices])
+    return Image.fromarray(palette[indices])
+
+
+def to_8bit(img):
+    """Scale 16-bit, 32-bit integer or float greyscale to 8-bit L.
+
+    Integer samples are taken as 16-bit (what Pillow decodes deep PNG and
+    TIFF into); floats in 0..1 are stretched, larger ones clipped to 0..255.
+    """
+    if np is None:
+        if img.mode == 'F':
+            _, high = img.getextrema()
+            scale = 255 if high <= 1.0 else 1
+            return img.point(lambda v: v * scale + 0.5).convert('L')
+        return img.convert('I').point(lambda v: v * (1 / 257)).convert('L')
+
+    samples = np.asarray(img)
+    if img.mode == 'F':
+        if samples.max(initial=0) <= 1.0:
+            samples = samples * 255
+        return Image.fromarray((np.clip(samples, 0, 255) + 0.5).astype(np.uint8))
+    samples = np.clip(samples, 0, 65535).astype(np.uint32)
+    return Image.fromarray(((samples + 128) // 257).astype(np.uint8))
+
+
+def to_16bit(img):
+    """Bring 32-bit integer or float greyscale into I;16 for encoders that keep 16 bits."""
+    if img.mode.startswith('I;16'):
+        return img if img.mode == 'I;16' else img.convert('I;16')
+    if np is None:
+        return img.convert('I').convert('I;16')
+    samples = np.asarray(img)
+    if img.mode == 'F' and samples.max(initial=0) <= 1.0:
+        samples = samples * 65535
+    return Image.fromarray(np.clip(samples, 0, 65535).astype(np.uint16))
+
+
+def cmyk_to_rgb(img):
+    """Convert CMYK to RGB as (255 - C) * (255 - K) / 255 per channel."""
+    if np is None:
+        return img.convert('RGB')
+    cmyk = np.asarray(img).astype(np.uint16)
+    white = 255 - cmyk[..., 3:]
+    rgb = ((255 - cmyk[..., :3]) * white + 127) // 255
+    return Image.fromarray(rgb.astype(np.uint8))
+
+
+def composite(img, matte=DEFAULT_MATTE):
+    """Flatten an LA or RGBA image onto a solid matte colour.
+
+    Greyscale stays L when the matte is grey; otherwise the result is RGB.
+    """
+    matte = tuple(matte)
+    grey = img.mode == 'LA' and matte[0] == matte[1] == matte[2]
+    if img.mode == 'LA' and not grey:
+        img = img.convert('RGBA')
+    mode = 'L' if grey else 'RGB'
+    colour = matte[:1] if grey else matte
+
+    if np is None:
+        background = Image.new(mode, img.size, colour if not grey else colour[0])
+        background.paste(img.convert(mode), mask=img.getchannel('A'))
+        return background
+
+    pixels = np.asarray(img).astype(np.uint32)
+    alpha = pixels[..., -1:]
+    blended = (pixels[..., :-1] * alpha + np.array(colour, dtype=np.uint32) * (255 - alpha) + 127) // 255
+    blended = blended.astype(np.uint8)
+    return Image.fromarray(blended[..., 0] if grey else blended)
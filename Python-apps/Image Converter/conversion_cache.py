@@ -0,0 +1,103 @@
+"""On-disk, content-addressed cache of converted outputs with LRU eviction."""
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'image_converter')
+DEFAULT_CACHE_MB = 2048
+
+
+class ConversionCache:
+    """Outputs keyed by source content hash plus target format and encode settings.
+
+    Entries live under cache_dir/<aa>/<key>.<ext>. A hit is served to the
+    output path as a hardlink (or a copy when link is False or linking
+    fails), so a repeated conversion costs about a file copy. The entry's
+    mtime is its last use; evict() drops the least recently used entries
+    until the cache fits in max_mb.
+
+    Instances are small and picklable so worker processes can share one.
+    """
+
+    def __init__(self, cache_dir=None, max_mb=DEFAULT_CACHE_MB, link=True):
+        self.cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.link = link
+
+    @staticmethod
+    def key(digest, settings):
+        payload = json.dumps(settings, sort_keys=True)
+        return hashlib.sha256(f"{digest}:{payload}".encode('utf-8')).hexdigest()
+
+    def entry_path(self, key, output_format):
+        return self.cache_dir / key[:2] / f"{key}.{output_format.lower()}"
+
+    def fetch(self, key, output_format, output_path):
+        """Materialise a cached output at output_path. Returns False on a miss."""
+        entry = self.entry_path(key, output_format)
+        if not entry.exists():
+            return False
+        try:
+            os.utime(entry)  # mark as recently used
+            self._materialise(entry, Path(output_path))
+        except OSError:
+            return False
+        return True
+
+    def store(self, key, output_format, output_path):
+        """Add a freshly written output to the cache."""
+        entry = self.entry_path(key, output_format)
+        if entry.exists():
+            return
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = entry.with_name(f"{entry.name}.{os.getpid()}.tmp")
+        try:
+            self._materialise(Path(output_path), tmp_path)
+            os.replace(tmp_path, entry)
+        except OSError:
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+
+    def _materialise(self, source, target):
+        if target.exists():
+            target.unlink()
+        if self.link:
+            try:
+                os.link(source, target)
+                return
+            except OSError:
+                pass  # different filesystem or no hardlink support
+        shutil.copyfile(source, target)
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in max_bytes."""
+        if not self.cache_dir.exists():
+            return 0
+        entries = []
+        total = 0
+        for entry in self.cache_dir.glob('*/*'):
+            if entry.name.endswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+            total += stat.st_size
+
+        removed = 0
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                entry.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        return removed
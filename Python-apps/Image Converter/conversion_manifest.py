@@ -0,0 +1,80 @@
+"""Per-output-folder record of what has been converted, for incremental batches."""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+MANIFEST_NAME = ".convert_manifest.json"
+
+
+def file_digest(filepath, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionManifest:
+    """Maps source path -> size, mtime, content hash, encode settings and output.
+
+    A source is up to date when its output still exists and the recorded
+    size, mtime and settings match. When only the mtime moved (a touch or a
+    copy), the caller can confirm with the content hash instead of re-encoding.
+    """
+
+    def __init__(self, output_folder):
+        self.path = Path(output_folder) / MANIFEST_NAME
+        self.entries = {}
+        self.dirty = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('files', {})
+        except (OSError, ValueError):
+            self.entries = {}
+
+    @staticmethod
+    def key(filepath, settings):
+        # One output folder can hold several target formats of the same source
+        return f"{os.path.abspath(filepath)}|{settings.get('format')}"
+
+    def check(self, filepath, stat, settings):
+        """Return 'fresh', 'verify' (hash needed) or 'stale' for filepath."""
+        entry = self.entries.get(self.key(filepath, settings))
+        if not entry or entry.get('settings') != settings:
+            return 'stale'
+        if not os.path.exists(entry.get('output', '')):
+            return 'stale'
+        if entry.get('size') != stat.st_size:
+            return 'stale'
+        if entry.get('mtime_ns') == stat.st_mtime_ns:
+            return 'fresh'
+        return 'verify'
+
+    def digest_for(self, filepath, settings):
+        entry = self.entries.get(self.key(filepath, settings))
+        return entry.get('sha256') if entry else None
+
+    def record(self, filepath, stat, digest, settings, output_path):
+        self.entries[self.key(filepath, settings)] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': digest,
+            'settings': settings,
+            'output': str(output_path),
+        }
+        self.dirty += 1
+        # Flush now and then so an interrupted run keeps most of its progress
+        if self.dirty >= 200:
+            self.save()
+
+    def save(self):
+        if not self.dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'files': self.entries}, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = 0
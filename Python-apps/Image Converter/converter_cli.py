@@ -0,0 +1,201 @@
+"""Headless command-line front end for the image converter.
+
+Example:
+    python converter_cli.py "photos/*.jpg" -f webp -o out -j 8
+    python converter_cli.py /mnt/nas/photos -f webp -o /srv/webp
+    python converter_cli.py "assets/*.png" -f webp png jpg@256 -o out
+"""
+import argparse
+import glob
+import itertools
+import multiprocessing
+import os
+import sys
+from dataclasses import replace
+
+from color_modes import DEFAULT_MATTE, parse_matte
+from conversion_cache import DEFAULT_CACHE_DIR, DEFAULT_CACHE_MB, ConversionCache
+from converter_engine import ConvertOptions, Throughput, iter_convert, parse_resize
+from discovery import iter_images
+from encoder_profiles import DEFAULT_PROFILE, PROFILES
+from fanout import iter_convert_multi, parse_target
+from pipeline_stats import StageStats
+from pipelined_io import QueueDepths
+from preflight import preflight
+
+
+def expand_inputs(patterns):
+    """Expand glob patterns (recursive ** allowed), keeping order and dropping duplicates."""
+    seen = set()
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) or [pattern]
+        for match in matches:
+            if os.path.isfile(match) and match not in seen:
+                seen.add(match)
+                files.append(match)
+    return files
+
+
+def resize_arg(spec):
+    try:
+        return parse_resize(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def matte_arg(spec):
+    try:
+        return parse_matte(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def target_arg(spec):
+    try:
+        return parse_target(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Convert images between formats without a GUI.")
+    parser.add_argument('inputs', nargs='+',
+                        help="input files or glob patterns, or a single folder to walk recursively")
+    parser.add_argument('-f', '--format', required=True, nargs='+', type=target_arg, metavar='FORMAT[@SIZE]',
+                        help="output format(s), optionally with a size (e.g. webp png jpg@256); several "
+                             "targets decode each source once and write one subfolder per target")
+    parser.add_argument('-o', '--output-dir',
+                        help="output folder (default: converted_<fmt> next to the first input)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument('-r', '--resize', type=resize_arg,
+                        help="resize target: 1024 (max edge), 800x600 (exact) or 50%% (scale)")
+    parser.add_argument('-p', '--profile', choices=PROFILES, default=DEFAULT_PROFILE,
+                        help=f"encoder profile, speed vs size (default: {DEFAULT_PROFILE})")
+    parser.add_argument('--no-passthrough', dest='passthrough', action='store_false',
+                        help="always decode and re-encode, even when the source already is in the target codec")
+    parser.add_argument('--strip-metadata', action='store_true',
+                        help="drop EXIF/XMP/text metadata from passed-through JPEG and PNG files")
+    parser.add_argument('--matte', type=matte_arg, default=DEFAULT_MATTE, metavar='COLOUR',
+                        help="colour transparent pixels are flattened onto for targets without alpha, "
+                             "e.g. white, black or #202020 (default: white)")
+    parser.add_argument('-m', '--max-memory', type=int, metavar='MB',
+                        help="per-file pixel memory ceiling; larger files fail instead of exhausting RAM")
+    parser.add_argument('-i', '--incremental', action='store_true',
+                        help="skip sources unchanged since the last run (uses a manifest in the output folder)")
+    parser.add_argument('-c', '--cache', nargs='?', const=DEFAULT_CACHE_DIR, metavar='DIR',
+                        help=f"reuse earlier outputs of identical sources (default dir: {DEFAULT_CACHE_DIR})")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_MB, metavar='MB',
+                        help=f"cache size cap; least recently used entries are evicted (default: {DEFAULT_CACHE_MB})")
+    parser.add_argument('--cache-copy', action='store_true',
+                        help="serve cache hits as copies instead of hardlinks")
+    parser.add_argument('--read-ahead', type=int, default=0, metavar='N',
+                        help="read up to N sources into memory ahead of the workers (helps on network shares)")
+    parser.add_argument('--write-behind', type=int, default=0, metavar='N',
+                        help="queue up to N encoded outputs for background writing instead of "
+                             "writing them in the workers")
+    parser.add_argument('--in-flight', type=int, metavar='N',
+                        help="files queued on the worker pool at once (default: 4 per worker)")
+    parser.add_argument('--preflight', action='store_true',
+                        help="read every header first: flag bad files, estimate the work and convert largest first")
+    parser.add_argument('--check', action='store_true',
+                        help="only run the pre-flight pass and print what would be converted")
+    parser.add_argument('--cprofile', metavar='DIR',
+                        help="profile every conversion with cProfile and write one merged .prof per run to DIR")
+    parser.add_argument('-q', '--quiet', action='store_true', help="only print failures")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    targets = args.format
+    multi = len(targets) > 1
+    if multi and (args.incremental or args.cache):
+        parser.error("--incremental and --cache work with a single output format")
+    if multi and (args.read_ahead or args.write_behind):
+        parser.error("--read-ahead and --write-behind work with a single output format")
+    if min(args.read_ahead, args.write_behind, args.in_flight or 1) < 0 or args.in_flight == 0:
+        parser.error("queue depths must be positive (0 turns read-ahead or write-behind off)")
+    folder_name = "converted" if multi else f"converted_{targets[0].output_format.lower()}"
+
+    if len(args.inputs) == 1 and os.path.isdir(args.inputs[0]):
+        # Folder mode: files stream in from the walk and the tree is mirrored
+        source_root = args.inputs[0]
+        output_folder = args.output_dir or os.path.join(source_root, folder_name)
+        files = iter_images(source_root, exclude=[output_folder])
+        total = None
+    else:
+        files = expand_inputs(args.inputs)
+        if not files:
+            print("No input files matched.", file=sys.stderr)
+            return 2
+        source_root = None
+        output_folder = args.output_dir or os.path.join(os.path.dirname(files[0]), folder_name)
+        total = len(files) * len(targets)
+
+    options = ConvertOptions(resize=args.resize, max_memory_mb=args.max_memory, profile=args.profile,
+                             passthrough=args.passthrough, strip_metadata=args.strip_metadata,
+                             matte=args.matte)
+
+    flagged = []
+    if args.preflight or args.check:
+        # Needs the whole list up front, so a folder walk finishes before converting starts
+        report = preflight(files, targets, options)
+        for probe in report.bad:
+            print(f"FLAGGED {probe.filepath}: {probe.error}", file=sys.stderr)
+        print(f"Pre-flight: {report.summary()}")
+        if args.check:
+            return 1 if report.bad else 0
+        files = report.largest_first()
+        flagged = report.failures()
+        total = len(report.ok) * len(targets) + len(report.bad)
+
+    if multi:
+        results = iter_convert_multi(files, targets, output_folder, args.jobs, options=options,
+                                     source_root=source_root, profile_dir=args.cprofile)
+    else:
+        if targets[0].resize is not None:
+            options = replace(options, resize=targets[0].resize)
+        cache = ConversionCache(args.cache, args.cache_size, link=not args.cache_copy) if args.cache else None
+        depths = QueueDepths(args.read_ahead, args.in_flight, args.write_behind)
+        results = iter_convert(files, targets[0].output_format, output_folder, args.jobs,
+                               incremental=args.incremental, options=options,
+                               source_root=source_root, profile_dir=args.cprofile, cache=cache,
+                               depths=depths)
+
+    success_count = 0
+    skipped_count = 0
+    cached_count = 0
+    failed_files = []
+    throughput = Throughput()
+    stage_stats = StageStats()
+    for i, result in enumerate(itertools.chain(flagged, results), 1):
+        throughput.add(result)
+        stage_stats.merge(result.stats)
+        counter = f"[{i}/{total}]" if total else f"[{i}]"
+        if result.error is None:
+            success_count += 1
+            skipped_count += result.skipped
+            cached_count += result.cached
+            if not args.quiet:
+                action = "up to date" if result.skipped else "=> (cached)" if result.cached else "->"
+                print(f"{counter} {result.filepath} {action} {result.output_path}")
+        else:
+            failed_files.append((result.filepath, result.error))
+            print(f"{counter} FAILED {result.filepath}: {result.error}", file=sys.stderr)
+
+    print(f"Wrote {success_count} out of {total or throughput.files} outputs into {output_folder} "
+          f"({skipped_count} already up to date, {cached_count} from cache, {throughput})")
+    if stage_stats.files:
+        print(stage_stats.table())
+    if args.cprofile:
+        print(f"cProfile dump written to {args.cprofile}")
+    return 1 if failed_files else 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,601 @@
+"""UI-free conversion engine shared by the GUI and the command line."""
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import closing, contextmanager
+from dataclasses import asdict, dataclass
+from functools import partial
+from pathlib import Path
+
+from PIL import Image, ImageSequence, UnidentifiedImageError
+
+from color_modes import DEFAULT_MATTE, needs_normalizing, normalize, normalized_mode
+from conversion_manifest import ConversionManifest, file_digest
+from discovery import sniff_bytes, sniff_format
+from encoder_profiles import DEFAULT_PROFILE, pil_format, save_params
+from passthrough import copy_bytes, is_complete, strip_metadata
+from pipeline_stats import StageStats, merge_profiles, profiled
+from pipelined_io import QueueDepths, WriteBehind, atomic_output, read_ahead, read_file, write_output
+
+# Supported output formats
+FORMATS = ['PNG', 'JPG', 'JPEG', 'BMP', 'GIF', 'TIFF', 'WEBP', 'ICO']
+
+# Targets that can hold every frame of an animated GIF or multi-page TIFF
+MULTI_FRAME_FORMATS = ['GIF', 'TIFF', 'WEBP', 'PNG']
+
+# Outcome of one file; error is None on success, skipped means already up to date,
+# stats is the worker's StageStats.as_dict() for files that were converted,
+# cached means the output was served from the conversion cache,
+# data carries encoded bytes from a worker to the batch's write-behind queue,
+# cache_key is where the batch stores those bytes (None when they must not be cached)
+ConvertResult = namedtuple('ConvertResult',
+                           'filepath output_path error bytes_in skipped digest stats cached data cache_key',
+                           defaults=(False, None, None, False, None, None))
+
+
+@dataclass(frozen=True)
+class ConvertOptions:
+    """Per-job transform settings, shared by every file in a batch.
+
+    resize is None or a parsed target from parse_resize:
+    ('max', n) longest edge, ('size', (w, h)) exact size, ('scale', pct).
+    max_memory_mb caps the estimated pixel memory one file may use; files
+    over the cap fail up front instead of taking the worker down with them.
+    profile names the encoder profile (see encoder_profiles.PROFILES).
+    passthrough lets sources already encoded in the target codec be copied
+    byte for byte when nothing else is asked of them; strip_metadata removes
+    EXIF/XMP/text metadata on that path without touching the pixels.
+    matte is the RGB colour transparent pixels are flattened onto for
+    targets without alpha (JPEG, or LA sources going to BMP).
+    """
+    resize: tuple = None
+    max_memory_mb: int = None
+    profile: str = DEFAULT_PROFILE
+    passthrough: bool = True
+    strip_metadata: bool = False
+    matte: tuple = DEFAULT_MATTE
+
+
+def parse_resize(spec):
+    """Parse '1024' (max edge), '800x600' (exact size) or '50%' (scale)."""
+    if not spec:
+        return None
+    spec = str(spec).strip().lower()
+    try:
+        if spec.endswith('%'):
+            pct = float(spec[:-1])
+            if pct > 0:
+                return ('scale', pct)
+        elif 'x' in spec:
+            width, height = (int(part) for part in spec.split('x', 1))
+            if width > 0 and height > 0:
+                return ('size', (width, height))
+        else:
+            edge = int(spec)
+            if edge > 0:
+                return ('max', edge)
+    except ValueError:
+        pass
+    raise ValueError(f"Invalid resize target '{spec}': use 1024, 800x600 or 50%")
+
+
+def target_size(size, resize):
+    """Output size for an image of the given size; never upscales for max edge."""
+    width, height = size
+    kind, value = resize
+    if kind == 'size':
+        return value
+    if kind == 'scale':
+        factor = value / 100
+    else:
+        factor = min(1.0, value / max(width, height))
+    return max(1, round(width * factor)), max(1, round(height * factor))
+
+
+class Throughput:
+    """Running files/s and MB/s counter for a batch."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.files = 0
+        self.bytes = 0
+
+    def add(self, result):
+        self.files += 1
+        self.bytes += result.bytes_in
+
+    def rates(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-6)
+        return self.files / elapsed, self.bytes / elapsed / (1024 * 1024)
+
+    def __str__(self):
+        files_per_s, mb_per_s = self.rates()
+        return f"{files_per_s:.1f} files/s · {mb_per_s:.1f} MB/s"
+
+
+def default_output_folder(filepaths, output_format):
+    """Batch output folder: converted_<fmt> next to the first file."""
+    first_file_dir = Path(filepaths[0]).parent
+    return first_file_dir / f"converted_{output_format.lower()}"
+
+
+def output_path_for(filepath, output_format, output_folder=None, source_root=None):
+    """Where filepath lands when converted; defaults to its own folder.
+
+    With source_root, the file's folder relative to source_root is mirrored
+    under output_folder.
+    """
+    file_path = Path(filepath)
+    folder = Path(output_folder) if output_folder is not None else file_path.parent
+    if output_folder is not None and source_root is not None:
+        folder = folder / os.path.relpath(file_path.parent, source_root)
+    return folder / f"{file_path.stem}.{output_format.lower()}"
+
+
+def encode_settings(output_format, options=None):
+    """Settings that affect the encoded bytes; part of the incremental manifest key."""
+    output_format = output_format.upper()
+    settings = {'format': output_format,
+                'params': save_params(output_format, options.profile if options else None)}
+    if options is not None:
+        # Round-trip through JSON so a reloaded manifest compares equal (tuples -> lists)
+        transform = json.loads(json.dumps(asdict(options)))
+        settings.update({key: value for key, value in transform.items() if value is not None})
+    return settings
+
+
+def frame_bytes(mode, size):
+    """Bytes Pillow holds in memory for one frame of this mode and size."""
+    if mode in ('1', 'L', 'P'):
+        pixel = 1
+    elif mode.startswith('I;16'):
+        pixel = 2
+    else:
+        pixel = 4  # RGB is stored padded to 4 bytes, like RGBA, I and F
+    return size[0] * size[1] * pixel
+
+
+def converted_bytes(mode, size, output_size, output_format, matte=DEFAULT_MATTE):
+    """Bytes prepare_frame allocates on top of a decoded frame of this mode and
+    size: the normalized copy, then the resized one. 0 when the frame goes to
+    the encoder as it is."""
+    resizing = size != output_size
+    converted = normalized_mode(mode, output_format, matte, expand_palette=resizing)
+    needed = frame_bytes(converted, size) if converted != mode else 0
+    if resizing:
+        needed += frame_bytes(converted, output_size)
+    return needed
+
+
+def open_image(filepath, output_format, options=None, data=None):
+    """Open filepath (or its bytes, when data is given) lazily and return
+    (img, output_size). Nothing is decoded yet.
+
+    JPEG sources get a reduced-resolution draft decode set up when the output
+    is smaller, so the decoder only produces 1/2, 1/4 or 1/8 of the pixels.
+    Open inside pixel_limit(options) so a memory ceiling takes the place of
+    Pillow's pixel limit.
+    """
+    options = options or ConvertOptions()
+
+    if data is None:
+        img = Image.open(filepath)
+    else:
+        try:
+            img = Image.open(io.BytesIO(data))
+        except UnidentifiedImageError:
+            # Name the file, not the in-memory buffer
+            raise UnidentifiedImageError(f"cannot identify image file {str(filepath)!r}") from None
+
+    size = img.size
+    if options.resize is not None:
+        size = target_size(img.size, options.resize)
+        if img.format == 'JPEG' and size[0] < img.width and size[1] < img.height:
+            img.draft(None, size)
+
+    # Decoded frame plus whatever copies prepare_frame makes of it for output_format
+    check_memory(img, frame_bytes(img.mode, img.size)
+                 + converted_bytes(img.mode, img.size, size, output_format, options.matte), options)
+
+    return img, size
+
+
+_pixel_limit_lock = threading.RLock()
+
+
+@contextmanager
+def pixel_limit(options):
+    """Lift Pillow's decompression-bomb pixel limit while an image is opened
+    and decoded for a job with a memory ceiling, which check_memory enforces
+    instead. The limit is restored on exit; without a ceiling it stays on."""
+    if options is None or not options.max_memory_mb:
+        yield
+        return
+    with _pixel_limit_lock:
+        limit = Image.MAX_IMAGE_PIXELS
+        Image.MAX_IMAGE_PIXELS = None
+        try:
+            yield
+        finally:
+            Image.MAX_IMAGE_PIXELS = limit
+
+
+def check_memory(img, needed, options):
+    """Raise MemoryError when needed bytes exceed the job's memory ceiling."""
+    if options is None or not options.max_memory_mb:
+        return
+    if needed > options.max_memory_mb * 1024 * 1024:
+        raise MemoryError(f"{img.width}x{img.height} {img.mode} needs about "
+                          f"{needed // (1024 * 1024)} MB, over the {options.max_memory_mb} MB limit")
+
+
+def prepare_frame(frame, size, output_format, matte=DEFAULT_MATTE):
+    """Fix one frame's mode for the target encoder and resize it.
+
+    The mode is normalized first (see color_modes.normalize), so resampling
+    runs on 8-bit colour and a flattened frame is resized only once.
+    """
+    resizing = frame.size != size
+    # Palette images only resize with nearest-neighbour; expand them first
+    frame = normalize(frame, output_format, matte, expand_palette=resizing)
+    if resizing:
+        frame = frame.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+    return frame
+
+
+def iter_frames(img, size, output_format, start=0, matte=DEFAULT_MATTE):
+    """Yield prepared frames one at a time, seeking the source lazily."""
+    for index, frame in enumerate(ImageSequence.Iterator(img)):
+        if index >= start:
+            yield prepare_frame(frame, size, output_format, matte)
+
+
+def passthrough_codec(filepath, output_format, options=None, data=None):
+    """The source's real codec if it can be passed through unchanged, else None.
+
+    The codec comes from the file's magic bytes, not its extension, so a
+    .jpeg "converted" to JPG qualifies but a PNG named .jpg does not.
+    """
+    options = options or ConvertOptions()
+    if not options.passthrough or options.resize is not None or options.profile != DEFAULT_PROFILE:
+        return None
+    codec = sniff_bytes(data[:16]) if data is not None else sniff_format(filepath)
+    if codec is None or codec != pil_format(output_format):
+        return None
+    if options.strip_metadata and codec not in ('JPEG', 'PNG'):
+        return None  # no byte-level stripper for this codec; re-encode instead
+    return codec
+
+
+def convert_file(filepath, output_format, output_path, options=None, stats=None, data=None, sink=None):
+    """Convert a single image and write it to output_path. Raises on failure.
+
+    Multi-frame sources keep every frame when the target supports it. Frames
+    are decoded and encoded one at a time, so memory stays at about one frame;
+    their decode and convert time is counted under 'encode'.
+
+    Sources already in the target codec skip decoding entirely when
+    passthrough_codec allows it and passthrough.is_complete finds the whole
+    file there; their bytes are copied (or metadata-stripped).
+
+    stats, a pipeline_stats.StageStats, receives per-stage timings and counters.
+
+    data, when given, is the source already read into memory (read-ahead) and
+    the file is not read again. sink(output_path, data), when given, takes
+    the encoded bytes in place of the atomic write to output_path
+    (write-behind); a passthrough with nothing in memory still copies directly.
+    """
+    output_format = output_format.upper()
+    options = options or ConvertOptions()
+    stats = stats if stats is not None else StageStats()
+    sink = sink or write_output
+
+    codec = passthrough_codec(filepath, output_format, options, data)
+    if codec is not None and not is_complete(filepath, codec, data):
+        codec = None  # truncated or damaged: decode it, so the failure is reported instead of copied
+    if codec is not None:
+        with stats.stage('write'):
+            if options.strip_metadata:
+                data = strip_metadata(data if data is not None else read_file(filepath), codec)
+            if data is None:
+                with atomic_output(output_path) as tmp_path:
+                    copy_bytes(filepath, tmp_path)
+                bytes_out = os.path.getsize(output_path)
+            else:
+                sink(output_path, data)
+                bytes_out = len(data)
+        stats.files += 1
+        stats.passthrough += 1
+        stats.bytes_out += bytes_out
+        return Path(output_path)
+
+    params = save_params(output_format, options.profile)
+    buffer = io.BytesIO()
+
+    # Open image
+    with pixel_limit(options), stats.stage('open'):
+        img, size = open_image(filepath, output_format, options, data)
+
+    # Pillow checks the pixel limit again when seeking frames and loading tiles
+    with pixel_limit(options), img:
+        n_frames = getattr(img, 'n_frames', 1)
+        if n_frames > 1 and output_format in MULTI_FRAME_FORMATS:
+            with stats.stage('encode'):
+                # The animated encoders expand palette frames themselves
+                if size == img.size and (img.mode == 'P' or not needs_normalizing(img.mode, output_format)):
+                    # Encoders walk the source's frames themselves
+                    img.save(buffer, pil_format(output_format), save_all=True, **params)
+                else:
+                    first = prepare_frame(img, size, output_format, options.matte)
+                    params.update({key: img.info[key] for key in ('duration', 'loop') if key in img.info})
+                    rest = iter_frames(img, size, output_format, 1, options.matte)
+                    if output_format != 'GIF':
+                        # Only the GIF encoder consumes append_images in a single pass;
+                        # the others need every resized frame in memory at once
+                        converted = normalized_mode(img.mode, output_format, options.matte,
+                                                    expand_palette=size != img.size)
+                        check_memory(img, frame_bytes(img.mode, img.size)
+                                     + n_frames * frame_bytes(converted, size), options)
+                        rest = list(rest)
+                    first.save(buffer, pil_format(output_format), save_all=True,
+                               append_images=rest, **params)
+            stats.pixels += img.width * img.height * n_frames
+        else:
+            with stats.stage('decode'):
+                img.load()
+            stats.pixels += img.width * img.height
+
+            with stats.stage('convert'):
+                img = prepare_frame(img, size, output_format, options.matte)
+
+            # Encode into memory so encode and write are timed apart
+            with stats.stage('encode'):
+                img.save(buffer, pil_format(output_format), **params)
+
+    with stats.stage('write'):
+        sink(output_path, buffer.getbuffer())
+
+    stats.files += 1
+    stats.bytes_out += buffer.tell()
+    return Path(output_path)
+
+
+def convert_to_folder(filepath, output_format, output_folder, want_digest=False, known_digest=None,
+                      options=None, source_root=None, profile_dir=None, cache=None,
+                      source_data=None, return_data=False):
+    """Convert one file into output_folder. Runs inside a worker process.
+
+    With want_digest the source's content hash is returned for the manifest;
+    if it equals known_digest the encode is skipped as already up to date.
+    With profile_dir the conversion runs under cProfile and dumps there.
+    With cache, a ConversionCache, outputs already produced from the same
+    content and settings are linked or copied instead of re-encoded.
+
+    source_data is the file's bytes when the batch has read it ahead. With
+    return_data the encoded output rides back on the result's data for the
+    batch's write-behind queue instead of being written here, with the
+    cache_key the batch stores it under when it would have been cached.
+    """
+    output_path = output_path_for(filepath, output_format, output_folder, source_root)
+    stats = StageStats()
+    try:
+        bytes_in = len(source_data) if source_data is not None else os.path.getsize(filepath)
+    except OSError:
+        bytes_in = 0
+    try:
+        digest = None
+        if want_digest or cache is not None:
+            digest = (hashlib.sha256(source_data).hexdigest() if source_data is not None
+                      else file_digest(filepath))
+        if known_digest is not None and digest == known_digest and output_path.exists():
+            return ConvertResult(filepath, str(output_path), None, bytes_in, True, digest)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+
+        cache_key = None
+        if cache is not None and passthrough_codec(filepath, output_format, options, source_data) is not None:
+            cache = None  # a straight copy is already as cheap as a cache hit
+        if cache is not None:
+            cache_key = cache.key(digest, encode_settings(output_format, options))
+            if cache.fetch(cache_key, output_format, output_path):
+                return ConvertResult(filepath, str(output_path), None, bytes_in, False, digest,
+                                     cached=True)
+
+        encoded = []
+        sink = (lambda _, data: encoded.append(bytes(data))) if return_data else None
+        with profiled(profile_dir):
+            convert_file(filepath, output_format, output_path, options, stats, source_data, sink)
+        stats.bytes_in += bytes_in
+        if encoded:
+            return ConvertResult(filepath, str(output_path), None, bytes_in, False, digest, stats.as_dict(),
+                                 data=encoded[0], cache_key=cache_key)
+        if cache is not None:
+            cache.store(cache_key, output_format, output_path)
+        return ConvertResult(filepath, str(output_path), None, bytes_in, False, digest, stats.as_dict())
+    except Exception as e:
+        return ConvertResult(filepath, str(output_path), str(e), bytes_in)
+
+
+def iter_convert(filepaths, output_format, output_folder, workers=None, cancel_event=None,
+                 incremental=False, options=None, source_root=None, profile_dir=None, cache=None,
+                 depths=None):
+    """Convert filepaths on a process pool, yielding a ConvertResult as each
+    file finishes. Setting cancel_event drops files that have not started yet.
+
+    filepaths may be any iterable, including a lazy generator such as
+    discovery.iter_images; it is only pulled from while fewer than a few
+    files per worker are queued, so conversion starts on the first file.
+    With source_root, outputs mirror the source tree under output_folder.
+
+    With incremental, a manifest in output_folder records what was converted
+    and sources that have not changed since are skipped without decoding.
+
+    With profile_dir, every conversion runs under cProfile and the dumps are
+    merged into one run-<time>.prof in profile_dir when the batch ends.
+
+    With cache, a conversion_cache.ConversionCache, repeated conversions of
+    the same content are served from disk; the cache is trimmed to its size
+    cap when the batch ends.
+
+    depths, a pipelined_io.QueueDepths, sets how many files each stage may
+    hold. With read_ahead, I/O threads here read the next sources into
+    memory while the workers encode; with write_behind, workers hand their
+    encoded bytes back and I/O threads here flush them, so neither reads nor
+    writes stall the encoders. A result is yielded once its output is on disk.
+    """
+    if isinstance(filepaths, (list, tuple)) and not filepaths:
+        return
+
+    output_format = output_format.upper()
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+
+    depths = depths or QueueDepths()
+    workers = worker_count(filepaths, workers)
+    settings = encode_settings(output_format, options)
+    manifest = ConversionManifest(output_folder) if incremental else None
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    def plan(sources):
+        """Yield (filepath, stat, known_digest, result); a result means there is nothing to convert."""
+        for filepath in sources:
+            if cancelled():
+                return
+            if manifest is None:
+                yield filepath, None, None, None
+                continue
+
+            try:
+                stat = os.stat(filepath)
+            except OSError as e:
+                yield filepath, None, None, ConvertResult(filepath, None, str(e), 0)
+                continue
+
+            state = manifest.check(filepath, stat, settings)
+            if state == 'fresh':
+                output_path = output_path_for(filepath, output_format, output_folder, source_root)
+                yield filepath, stat, None, ConvertResult(filepath, str(output_path), None, stat.st_size, True,
+                                                          manifest.digest_for(filepath, settings))
+                continue
+
+            known_digest = manifest.digest_for(filepath, settings) if state == 'verify' else None
+            yield filepath, stat, known_digest, None
+
+    def submissions():
+        """(convert_to_folder arguments, (stat, settled result)) for pooled()."""
+        for (filepath, stat, known_digest, result), data in jobs:
+            if result is not None:
+                yield None, (stat, result)
+                continue
+            yield ((filepath, output_format, str(output_folder), manifest is not None, known_digest, options,
+                    source_root, profile_dir, cache, data, writer is not None), (stat, None))
+
+    def finish(result, stat):
+        if manifest is not None and result.error is None:
+            manifest.record(result.filepath, stat, result.digest, settings, result.output_path)
+        return result
+
+    def written(writes):
+        for (result, stat), error, seconds in writes:
+            if error is not None:
+                result = result._replace(error=error, stats=None)
+            elif result.stats:
+                result.stats['seconds']['write'] += seconds
+            yield finish(result, stat)
+
+    jobs = plan(filepaths)
+    if depths.read_ahead:
+        # Sources already settled by the manifest are not read
+        jobs = read_ahead(jobs, depths.read_ahead, lambda job: job[0] if job[3] is None else None)
+    else:
+        jobs = ((job, None) for job in jobs)
+    writer = WriteBehind(depths.write_behind) if depths.write_behind else None
+
+    try:
+        with closing(pooled(convert_to_folder, submissions(), workers, depths.in_flight, cancel_event)) as rounds:
+            for done in rounds:
+                for (stat, settled), result in done:
+                    if settled is not None:
+                        yield settled
+                    elif result.data is None:
+                        yield finish(result, stat)
+                    else:
+                        store = None
+                        if result.cache_key is not None:
+                            # Only what the worker would have cached itself; passthroughs have no key
+                            store = partial(cache.store, result.cache_key, output_format, result.output_path)
+                        writer.submit((result._replace(data=None, cache_key=None), stat), result.output_path,
+                                      result.data, store)
+                if writer is not None:
+                    yield from written(writer.completed())
+        if writer is not None:
+            # Outputs already handed to the writer still land, after a cancel too: report and record them
+            yield from written(writer.completed(wait_all=True))
+    finally:
+        jobs.close()
+        if writer is not None:
+            writer.close()
+            # Writes that landed after the caller stopped reading still go in the manifest
+            for _ in written(writer.completed()):
+                pass
+        if manifest is not None:
+            manifest.save()
+        if profile_dir:
+            merge_profiles(profile_dir)
+        if cache is not None:
+            cache.evict()
+
+
+def worker_count(filepaths, workers=None):
+    """workers (default: one per CPU), but no more than there are files when filepaths is a list."""
+    workers = workers or os.cpu_count() or 1
+    if isinstance(filepaths, (list, tuple)):
+        workers = min(workers, len(filepaths))
+    return max(1, workers)
+
+
+def pooled(task, jobs, workers, window=None, cancel_event=None):
+    """Run task(*args) on a process pool for every (args, tag) pulled from jobs.
+
+    Jobs are pulled lazily, only while fewer than window (default: four per
+    worker) are queued. Yields a list of (tag, result) about every 0.2 s in
+    completion order, possibly empty, so callers can do other work between
+    results. A job whose args are None is already settled and comes straight
+    back as (tag, None). Setting cancel_event stops pulling jobs and drops
+    queued ones that have not started; the pool is shut down on exit.
+    """
+    window = window or workers * 4
+
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+
+    exhausted = False
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = {}
+        while True:
+            # Keep the pool fed from the job iterator, a bounded window at a time
+            while not exhausted and len(pending) < window and not cancelled():
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                    break
+                args, tag = job
+                if args is None:
+                    yield [(tag, None)]
+                else:
+                    pending[executor.submit(task, *args)] = tag
+
+            if cancelled() or not pending:
+                break
+
+            # Results stream back as each job finishes, in completion order
+            done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            yield [(pending.pop(future), future.result()) for future in done]
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
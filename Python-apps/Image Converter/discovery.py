@@ -0,0 +1,73 @@
+"""Lazy discovery of image files under a folder tree."""
+import os
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp', '.ico'}
+
+# Leading bytes of each supported container
+MAGIC_BYTES = [
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+    (b'BM', 'BMP'),
+    (b'II*\x00', 'TIFF'),
+    (b'MM\x00*', 'TIFF'),
+    (b'\x00\x00\x01\x00', 'ICO'),
+]
+
+
+def sniff_format(filepath):
+    """Return the image format named by the file's magic bytes, or None."""
+    try:
+        with open(filepath, 'rb') as f:
+            head = f.read(16)
+    except OSError:
+        return None
+    return sniff_bytes(head)
+
+
+def sniff_bytes(head):
+    """Return the image format named by leading bytes (16 are enough), or None."""
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    for magic, name in MAGIC_BYTES:
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def iter_images(root, recursive=True, check_magic=True, exclude=()):
+    """Yield image paths under root as the walk finds them.
+
+    Uses os.scandir with an explicit stack, so the first file comes out
+    before the rest of the tree has been listed. Files are filtered by
+    extension and, with check_magic, by their leading bytes. Folders in
+    exclude (e.g. the output folder) are not entered.
+    """
+    excluded = {os.path.normcase(os.path.abspath(path)) for path in exclude}
+    stack = [root]
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as entries:
+                subfolders = []
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if os.path.normcase(os.path.abspath(entry.path)) not in excluded:
+                                subfolders.append(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+                    if os.path.splitext(entry.name)[1].lower() not in IMAGE_EXTENSIONS:
+                        continue
+                    if check_magic and sniff_format(entry.path) is None:
+                        continue
+                    yield entry.path
+        except OSError:
+            continue
+        if recursive:
+            # Reversed so folders are visited in listing order
+            stack.extend(reversed(subfolders))
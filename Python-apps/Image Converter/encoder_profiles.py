@@ -0,0 +1,54 @@
+"""Named encoder profiles trading encode speed against output size."""
+
+PROFILES = ['fast', 'balanced', 'smallest', 'lossless']
+DEFAULT_PROFILE = 'balanced'
+
+# Pillow save() keyword arguments per Pillow format and profile.
+# 'balanced' matches the converter's historical output (JPEG quality 95,
+# Pillow defaults elsewhere), so existing jobs produce the same bytes.
+ENCODER_PROFILES = {
+    'JPEG': {
+        'fast': {'quality': 90, 'subsampling': '4:2:0', 'optimize': False, 'progressive': False},
+        'balanced': {'quality': 95},
+        'smallest': {'quality': 85, 'subsampling': '4:2:0', 'optimize': True, 'progressive': True},
+        'lossless': {'quality': 100, 'subsampling': '4:4:4', 'optimize': True},
+    },
+    'PNG': {
+        'fast': {'compress_level': 1},
+        'balanced': {'compress_level': 6},
+        'smallest': {'compress_level': 9, 'optimize': True},
+        'lossless': {'compress_level': 9, 'optimize': True},
+    },
+    'WEBP': {
+        'fast': {'method': 0, 'quality': 80},
+        'balanced': {'method': 4, 'quality': 80},
+        'smallest': {'method': 6, 'quality': 75},
+        'lossless': {'lossless': True, 'method': 4, 'quality': 100},
+    },
+    'TIFF': {
+        'fast': {'compression': 'raw'},
+        'balanced': {},
+        'smallest': {'compression': 'tiff_adobe_deflate'},
+        'lossless': {'compression': 'tiff_lzw'},
+    },
+    'GIF': {
+        'fast': {'optimize': False},
+        'balanced': {},
+        'smallest': {'optimize': True},
+        'lossless': {},
+    },
+}
+
+
+def pil_format(output_format):
+    """Pillow's name for an output format (JPG is saved as JPEG)."""
+    output_format = output_format.upper()
+    return 'JPEG' if output_format == 'JPG' else output_format
+
+
+def save_params(output_format, profile=None):
+    """Keyword arguments for Image.save for this format and profile."""
+    profile = profile or DEFAULT_PROFILE
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown encoder profile '{profile}': choose from {', '.join(PROFILES)}")
+    return dict(ENCODER_PROFILES.get(pil_format(output_format), {}).get(profile, {}))
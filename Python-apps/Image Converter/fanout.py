@@ -0,0 +1,193 @@
+"""Decode once, encode to several targets (formats and sizes) in parallel."""
+import io
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import replace
+from pathlib import Path
+
+from PIL import Image
+
+from converter_engine import (FORMATS, ConvertOptions, ConvertResult, check_memory,
+                              convert_file, converted_bytes, frame_bytes, output_path_for, parse_resize,
+                              passthrough_codec, pixel_limit, pooled, prepare_frame, target_size,
+                              worker_count)
+from encoder_profiles import pil_format, save_params
+from pipeline_stats import StageStats, merge_profiles, profiled
+from pipelined_io import write_output
+
+# One output of a fan-out job; resize None keeps the job-wide resize
+Target = namedtuple('Target', 'output_format resize', defaults=(None,))
+
+
+def parse_target(spec):
+    """Parse 'WEBP' or 'JPG@1024' / 'PNG@800x600' / 'WEBP@50%' into a Target."""
+    output_format, _, size = str(spec).partition('@')
+    output_format = output_format.strip().upper()
+    if output_format not in FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}': choose from {', '.join(FORMATS)}")
+    return Target(output_format, parse_resize(size) if size else None)
+
+
+def target_label(target):
+    """Folder name for a target's outputs, e.g. 'webp' or 'jpg_1024'."""
+    label = target.output_format.lower()
+    if target.resize is not None:
+        kind, value = target.resize
+        if kind == 'size':
+            label += f"_{value[0]}x{value[1]}"
+        elif kind == 'scale':
+            label += f"_{value:g}pct"
+        else:
+            label += f"_{value}"
+    return label
+
+
+def target_options(target, options):
+    """Job options with the target's own resize applied."""
+    options = options or ConvertOptions()
+    if target.resize is None:
+        return options
+    return replace(options, resize=target.resize)
+
+
+def encode_target(img, size, output_format, output_path, options):
+    """Resize/convert the shared decoded image and encode it. Runs on a thread;
+    Pillow releases the GIL in resampling and in the encoders."""
+    stats = StageStats()
+    params = save_params(output_format, options.profile)
+    with stats.stage('convert'):
+        frame = prepare_frame(img, size, output_format, options.matte)
+        if frame is img:
+            # save() keeps its options on the image (encoderinfo): never share one between threads
+            frame = img.copy()
+    buffer = io.BytesIO()
+    with stats.stage('encode'):
+        frame.save(buffer, pil_format(output_format), **params)
+    with stats.stage('write'):
+        write_output(output_path, buffer.getbuffer())
+    stats.bytes_out += buffer.tell()
+    return stats
+
+
+def convert_file_multi(filepath, outputs, options=None, stats=None, errors=None):
+    """Convert filepath to every (target, output_path) in outputs, decoding it once.
+
+    Targets that can be passed through are copied, and multi-frame sources go
+    through convert_file per target so no frames are lost. Everything else
+    shares one decode, drafted to the largest size any target needs, and the
+    encoders run in parallel threads over that single pixel buffer.
+
+    Returns {output_path: error or None}. A failing target does not stop the
+    others; a failure to open or decode the source raises. Pass errors to
+    keep the results of targets finished before such a failure.
+    """
+    options = options or ConvertOptions()
+    stats = stats if stats is not None else StageStats()
+    errors = errors if errors is not None else {}
+
+    def convert_alone(target, output_path, per_target):
+        try:
+            convert_file(filepath, target.output_format, output_path, per_target, stats)
+            errors[output_path] = None
+        except Exception as e:
+            errors[output_path] = str(e)
+
+    shared = []
+    for target, output_path in outputs:
+        per_target = target_options(target, options)
+        if passthrough_codec(filepath, target.output_format, per_target) is not None:
+            convert_alone(target, output_path, per_target)
+        else:
+            shared.append((target, output_path, per_target))
+    if not shared:
+        return errors
+
+    with pixel_limit(options), stats.stage('open'):
+        img = Image.open(filepath)
+
+    with pixel_limit(options), img:
+        if getattr(img, 'n_frames', 1) > 1:
+            for target, output_path, per_target in shared:
+                convert_alone(target, output_path, per_target)
+            return errors
+
+        sizes = [target_size(img.size, per_target.resize) if per_target.resize else img.size
+                 for _, _, per_target in shared]
+        largest = max(sizes, key=lambda size: size[0] * size[1])
+        if img.format == 'JPEG' and largest[0] < img.width and largest[1] < img.height:
+            img.draft(None, largest)
+
+        # One decoded buffer plus the copies each target in flight makes of it;
+        # a target that needs no conversion still gets a plain copy (see encode_target)
+        check_memory(img, frame_bytes(img.mode, img.size)
+                     + sum(converted_bytes(img.mode, img.size, size, target.output_format, per_target.matte)
+                           or frame_bytes(img.mode, img.size)
+                           for (target, _, per_target), size in zip(shared, sizes)), options)
+
+        with stats.stage('decode'):
+            img.load()
+        stats.pixels += img.width * img.height
+
+        with ThreadPoolExecutor(max_workers=len(shared)) as pool:
+            futures = {output_path: pool.submit(encode_target, img, size, target.output_format,
+                                                output_path, per_target)
+                       for (target, output_path, per_target), size in zip(shared, sizes)}
+            for output_path, future in futures.items():
+                try:
+                    stats.merge(future.result().as_dict())
+                    stats.files += 1
+                    errors[output_path] = None
+                except Exception as e:
+                    errors[output_path] = str(e)
+    return errors
+
+
+def convert_to_targets(filepath, targets, output_root, options=None, source_root=None, profile_dir=None):
+    """Worker entry point: one ConvertResult per target for filepath."""
+    outputs = [(target, output_path_for(filepath, target.output_format,
+                                        Path(output_root) / target_label(target), source_root))
+               for target in targets]
+    try:
+        bytes_in = os.path.getsize(filepath)
+    except OSError:
+        bytes_in = 0
+    stats = StageStats()
+    errors = {}
+    try:
+        for _, output_path in outputs:
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+        with profiled(profile_dir):
+            convert_file_multi(filepath, outputs, options, stats, errors)
+    except Exception as e:
+        # Targets passed through before the shared open failed are already written
+        for _, output_path in outputs:
+            errors.setdefault(output_path, str(e))
+    stats.bytes_in += bytes_in
+
+    # Input bytes and stats ride on the first result so batch totals count the decode once
+    return [ConvertResult(filepath, str(output_path), errors.get(output_path), bytes_in if i == 0 else 0,
+                          stats=stats.as_dict() if i == 0 else None)
+            for i, (_, output_path) in enumerate(outputs)]
+
+
+def iter_convert_multi(filepaths, targets, output_root, workers=None, cancel_event=None,
+                       options=None, source_root=None, profile_dir=None):
+    """Like converter_engine.iter_convert, but every source is decoded once and
+    written to all targets, each in its own output_root/<label> folder.
+    Yields one ConvertResult per source and target as sources finish."""
+    targets = list(targets)
+    if isinstance(filepaths, (list, tuple)) and not filepaths:
+        return
+    jobs = (((filepath, targets, str(output_root), options, source_root, profile_dir), None)
+            for filepath in filepaths)
+    try:
+        with closing(pooled(convert_to_targets, jobs, worker_count(filepaths, workers),
+                            cancel_event=cancel_event)) as rounds:
+            for done in rounds:
+                for _, results in done:
+                    yield from results
+    finally:
+        if profile_dir:
+            merge_profiles(profile_dir)
@@ -1,14 +1,28 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox
-from PIL import Image
+import itertools
 import os
-from pathlib import Path
+import queue
+import threading
+import multiprocessing
+
+from color_modes import parse_matte
+from conversion_cache import ConversionCache
+from discovery import iter_images
+from fanout import Target, convert_file_multi, iter_convert_multi
+from encoder_profiles import DEFAULT_PROFILE, PROFILES
+from pipeline_stats import StageStats
+from pipelined_io import DEFAULT_READ_AHEAD, DEFAULT_WRITE_BEHIND, QueueDepths
+from preflight import preflight
+from converter_engine import (FORMATS, ConvertOptions, Throughput, convert_file,
+                              default_output_folder, iter_convert, output_path_for,
+                              parse_resize)
 
 class ImageConverterApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Image Converter")
-        self.root.geometry("700x800")
+        self.root.geometry("700x900")
         self.root.resizable(True, True)
         
         # Premium dark purple theme colors
@@ -26,7 +40,7 @@ class ImageConverterApp:
         self.root.configure(bg=self.bg_dark)
         
         # Supported formats
-        self.formats = ['PNG', 'JPG', 'JPEG', 'BMP', 'GIF', 'TIFF', 'WEBP', 'ICO']
+        self.formats = list(FORMATS)
         
         # Create main frame with glow effect
         glow_frame = tk.Frame(root, bg=self.purple_main, padx=2, pady=2)
@@ -84,6 +98,17 @@ class ImageConverterApp:
                                     activeforeground=self.purple_light,
                                     bd=0, highlightthickness=0)
         batch_radio.pack(side=tk.LEFT, padx=20)
+
+        folder_radio = tk.Radiobutton(radio_frame, text="Folder",
+                                     variable=self.mode_var, value="folder",
+                                     command=self.update_mode,
+                                     font=('Segoe UI', 11),
+                                     bg=self.bg_dark, fg=self.text_primary,
+                                     selectcolor=self.purple_dark,
+                                     activebackground=self.bg_dark,
+                                     activeforeground=self.purple_light,
+                                     bd=0, highlightthickness=0)
+        folder_radio.pack(side=tk.LEFT, padx=20)
         
         # File selection area
         file_container = tk.Frame(main_frame, bg=self.bg_dark, padx=20, pady=20)
@@ -147,10 +172,172 @@ class ImageConverterApp:
                 # Hover effects
                 btn.bind('<Enter>', lambda e, b=btn: b.config(bg=self.purple_main))
                 btn.bind('<Leave>', lambda e, b=btn, f=fmt: 
-                        b.config(bg=self.purple_main if self.format_var.get() == f else self.purple_dark))
+                        b.config(bg=self.purple_main if f in self.selected_formats else self.purple_dark))
 
         # Highlight the default format
         self.format_buttons['PNG'].config(bg=self.purple_main, fg=self.text_primary)
+        self.selected_formats = ['PNG']
+
+        batch_options_frame = tk.Frame(format_container, bg=self.bg_card)
+        batch_options_frame.pack()
+
+        # Several formats at once: each source is decoded once and encoded to all of them
+        self.multi_format_var = tk.BooleanVar(value=False)
+        multi_format_check = tk.Checkbutton(batch_options_frame, text="Multiple formats (decode once)",
+                                            variable=self.multi_format_var,
+                                            command=self.update_multi_format,
+                                            font=('Segoe UI', 10),
+                                            bg=self.bg_card, fg=self.text_primary,
+                                            selectcolor=self.purple_dark,
+                                            activebackground=self.bg_card,
+                                            activeforeground=self.purple_light,
+                                            bd=0, highlightthickness=0)
+        multi_format_check.pack(side=tk.LEFT)
+
+        # Read every header before converting: flags bad files and runs the biggest first
+        self.preflight_var = tk.BooleanVar(value=False)
+        preflight_check = tk.Checkbutton(batch_options_frame, text="Pre-flight check",
+                                         variable=self.preflight_var,
+                                         font=('Segoe UI', 10),
+                                         bg=self.bg_card, fg=self.text_primary,
+                                         selectcolor=self.purple_dark,
+                                         activebackground=self.bg_card,
+                                         activeforeground=self.purple_light,
+                                         bd=0, highlightthickness=0)
+        preflight_check.pack(side=tk.LEFT, padx=(20, 0))
+
+        # Worker count for batch mode
+        workers_frame = tk.Frame(format_container, bg=self.bg_card)
+        workers_frame.pack(pady=(10, 0))
+
+        workers_label = tk.Label(workers_frame, text="WORKERS",
+                                font=('Segoe UI', 9, 'bold'),
+                                bg=self.bg_card, fg=self.text_secondary)
+        workers_label.pack(side=tk.LEFT, padx=(0, 10))
+
+        self.workers_var = tk.IntVar(value=os.cpu_count() or 1)
+        workers_spin = tk.Spinbox(workers_frame, from_=1, to=max(64, os.cpu_count() or 1),
+                                  textvariable=self.workers_var, width=4,
+                                  font=('Segoe UI', 10),
+                                  bg=self.bg_dark, fg=self.text_primary,
+                                  buttonbackground=self.purple_dark,
+                                  insertbackground=self.text_primary,
+                                  bd=0, relief=tk.FLAT)
+        workers_spin.pack(side=tk.LEFT)
+
+        self.incremental_var = tk.BooleanVar(value=False)
+        incremental_check = tk.Checkbutton(workers_frame, text="Skip unchanged",
+                                           variable=self.incremental_var,
+                                           font=('Segoe UI', 10),
+                                           bg=self.bg_card, fg=self.text_primary,
+                                           selectcolor=self.purple_dark,
+                                           activebackground=self.bg_card,
+                                           activeforeground=self.purple_light,
+                                           bd=0, highlightthickness=0)
+        incremental_check.pack(side=tk.LEFT, padx=(20, 0))
+
+        self.cache_var = tk.BooleanVar(value=False)
+        cache_check = tk.Checkbutton(workers_frame, text="Use cache",
+                                     variable=self.cache_var,
+                                     font=('Segoe UI', 10),
+                                     bg=self.bg_card, fg=self.text_primary,
+                                     selectcolor=self.purple_dark,
+                                     activebackground=self.bg_card,
+                                     activeforeground=self.purple_light,
+                                     bd=0, highlightthickness=0)
+        cache_check.pack(side=tk.LEFT, padx=(20, 0))
+
+        self.strip_var = tk.BooleanVar(value=False)
+        strip_check = tk.Checkbutton(workers_frame, text="Strip metadata",
+                                     variable=self.strip_var,
+                                     font=('Segoe UI', 10),
+                                     bg=self.bg_card, fg=self.text_primary,
+                                     selectcolor=self.purple_dark,
+                                     activebackground=self.bg_card,
+                                     activeforeground=self.purple_light,
+                                     bd=0, highlightthickness=0)
+        strip_check.pack(side=tk.LEFT, padx=(20, 0))
+
+        # Read ahead and write behind on I/O threads; pays off on network shares
+        self.overlap_io_var = tk.BooleanVar(value=False)
+        overlap_io_check = tk.Checkbutton(workers_frame, text="Overlap I/O",
+                                          variable=self.overlap_io_var,
+                                          font=('Segoe UI', 10),
+                                          bg=self.bg_card, fg=self.text_primary,
+                                          selectcolor=self.purple_dark,
+                                          activebackground=self.bg_card,
+                                          activeforeground=self.purple_light,
+                                          bd=0, highlightthickness=0)
+        overlap_io_check.pack(side=tk.LEFT, padx=(20, 0))
+
+        # Encoder profile: speed vs size
+        profile_frame = tk.Frame(format_container, bg=self.bg_card)
+        profile_frame.pack(pady=(10, 0))
+
+        profile_label = tk.Label(profile_frame, text="ENCODER",
+                                font=('Segoe UI', 9, 'bold'),
+                                bg=self.bg_card, fg=self.text_secondary)
+        profile_label.pack(side=tk.LEFT, padx=(0, 10))
+
+        self.profile_var = tk.StringVar(value=DEFAULT_PROFILE)
+        for profile in PROFILES:
+            profile_radio = tk.Radiobutton(profile_frame, text=profile.capitalize(),
+                                          variable=self.profile_var, value=profile,
+                                          font=('Segoe UI', 10),
+                                          bg=self.bg_card, fg=self.text_primary,
+                                          selectcolor=self.purple_dark,
+                                          activebackground=self.bg_card,
+                                          activeforeground=self.purple_light,
+                                          bd=0, highlightthickness=0)
+            profile_radio.pack(side=tk.LEFT, padx=6)
+
+        # Optional resize target
+        resize_frame = tk.Frame(format_container, bg=self.bg_card)
+        resize_frame.pack(pady=(10, 0))
+
+        resize_label = tk.Label(resize_frame, text="RESIZE",
+                               font=('Segoe UI', 9, 'bold'),
+                               bg=self.bg_card, fg=self.text_secondary)
+        resize_label.pack(side=tk.LEFT, padx=(0, 10))
+
+        self.resize_var = tk.StringVar(value="")
+        resize_entry = tk.Entry(resize_frame, textvariable=self.resize_var, width=12,
+                                font=('Segoe UI', 10),
+                                bg=self.bg_dark, fg=self.text_primary,
+                                insertbackground=self.text_primary,
+                                bd=0, relief=tk.FLAT)
+        resize_entry.pack(side=tk.LEFT)
+
+        resize_hint = tk.Label(resize_frame, text="e.g. 1024 · 800x600 · 50%",
+                              font=('Segoe UI', 9),
+                              bg=self.bg_card, fg=self.text_secondary)
+        resize_hint.pack(side=tk.LEFT, padx=(10, 0))
+
+        memory_label = tk.Label(resize_frame, text="MAX MB",
+                               font=('Segoe UI', 9, 'bold'),
+                               bg=self.bg_card, fg=self.text_secondary)
+        memory_label.pack(side=tk.LEFT, padx=(20, 10))
+
+        self.memory_var = tk.StringVar(value="")
+        memory_entry = tk.Entry(resize_frame, textvariable=self.memory_var, width=6,
+                                font=('Segoe UI', 10),
+                                bg=self.bg_dark, fg=self.text_primary,
+                                insertbackground=self.text_primary,
+                                bd=0, relief=tk.FLAT)
+        memory_entry.pack(side=tk.LEFT)
+
+        matte_label = tk.Label(resize_frame, text="MATTE",
+                              font=('Segoe UI', 9, 'bold'),
+                              bg=self.bg_card, fg=self.text_secondary)
+        matte_label.pack(side=tk.LEFT, padx=(20, 10))
+
+        self.matte_var = tk.StringVar(value="white")
+        matte_entry = tk.Entry(resize_frame, textvariable=self.matte_var, width=8,
+                               font=('Segoe UI', 10),
+                               bg=self.bg_dark, fg=self.text_primary,
+                               insertbackground=self.text_primary,
+                               bd=0, relief=tk.FLAT)
+        matte_entry.pack(side=tk.LEFT)
         
         # Convert button with glow
         btn_glow_frame = tk.Frame(main_frame, bg=self.purple_glow, padx=2, pady=2)
@@ -170,25 +357,64 @@ class ImageConverterApp:
         self.convert_btn.pack()
         self.convert_btn.bind('<Enter>', self.on_convert_hover)
         self.convert_btn.bind('<Leave>', self.on_convert_leave)
+
+        # Cancel button, only active while a conversion is running
+        self.cancel_btn = tk.Button(main_frame, text="CANCEL",
+                                   command=self.cancel_conversion,
+                                   state='disabled',
+                                   font=('Segoe UI', 9, 'bold'),
+                                   bg=self.bg_dark, fg=self.text_secondary,
+                                   activebackground=self.purple_dark,
+                                   activeforeground=self.text_primary,
+                                   bd=0, padx=20, pady=6,
+                                   cursor='hand2',
+                                   relief=tk.FLAT,
+                                   disabledforeground=self.text_secondary)
+        self.cancel_btn.pack(pady=(0, 15))
         
         # Status label
         self.status_label = tk.Label(main_frame, text="", 
                                     font=('Segoe UI', 10),
                                     bg=self.bg_card, fg='#FFFFFF')
         self.status_label.pack()
+
+        # Live throughput readout
+        self.rate_label = tk.Label(main_frame, text="",
+                                  font=('Segoe UI', 9),
+                                  bg=self.bg_card, fg=self.text_secondary)
+        self.rate_label.pack()
         
         # Store selected files
         self.selected_files = []
+
+        # Background conversion state; the worker thread only talks to the UI
+        # through progress_queue, which poll_progress drains with after()
+        self.progress_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.worker = None
     
     def select_format(self, format_name):
         """Handle format button selection"""
-        # Reset all buttons to default style
+        if self.multi_format_var.get():
+            # Toggle, keeping at least one format selected
+            if format_name in self.selected_formats:
+                if len(self.selected_formats) > 1:
+                    self.selected_formats.remove(format_name)
+            else:
+                self.selected_formats.append(format_name)
+        else:
+            self.selected_formats = [format_name]
+
+        # Highlight selected buttons
         for fmt, btn in self.format_buttons.items():
-            btn.config(bg=self.purple_dark, fg=self.text_primary)
-        
-        # Highlight selected button
-        self.format_buttons[format_name].config(bg=self.purple_main, fg=self.text_primary)
-        self.format_var.set(format_name)
+            btn.config(bg=self.purple_main if fmt in self.selected_formats else self.purple_dark,
+                       fg=self.text_primary)
+        self.format_var.set(self.selected_formats[0])
+
+    def update_multi_format(self):
+        # Leaving multi-select keeps only the first chosen format
+        if not self.multi_format_var.get():
+            self.select_format(self.selected_formats[0])
     
     def on_convert_hover(self, event):
         if self.convert_btn['state'] == 'normal':
@@ -202,6 +428,8 @@ class ImageConverterApp:
         mode = self.mode_var.get()
         if mode == "single":
             self.select_btn.config(text="📁 Select File")
+        elif mode == "folder":
+            self.select_btn.config(text="📁 Select Folder")
         else:
             self.select_btn.config(text="📁 Select Files")
         self.file_label.config(text="No file selected", fg=self.text_secondary)
@@ -229,6 +457,15 @@ class ImageConverterApp:
                     display_name = display_name[:47] + "..."
                 self.file_label.config(text=f"✓ {display_name}", fg=self.purple_light)
                 self.convert_btn.config(state='normal', bg=self.purple_main)
+        elif mode == "folder":
+            folder = filedialog.askdirectory(title="Select a folder of images")
+            if folder:
+                self.selected_files = [folder]
+                display_name = folder
+                if len(display_name) > 50:
+                    display_name = "..." + display_name[-47:]
+                self.file_label.config(text=f"✓ {display_name} (with subfolders)", fg=self.purple_light)
+                self.convert_btn.config(state='normal', bg=self.purple_main)
         else:
             filenames = filedialog.askopenfilenames(
                 title="Select images",
@@ -240,101 +477,216 @@ class ImageConverterApp:
                 self.convert_btn.config(state='normal', bg=self.purple_main)
     
     def convert_images(self):
+        if self.worker is not None and self.worker.is_alive():
+            return
+
         if not self.selected_files:
             messagebox.showwarning("No Files", "Please select file(s) to convert.")
             return
         
-        output_format = self.format_var.get().upper()
+        output_formats = [fmt.upper() for fmt in self.selected_formats]
         mode = self.mode_var.get()
+
+        try:
+            workers = max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            workers = os.cpu_count() or 1
+
+        try:
+            resize = parse_resize(self.resize_var.get())
+        except ValueError as e:
+            messagebox.showwarning("Invalid Resize", str(e))
+            return
+
+        max_memory = self.memory_var.get().strip()
+        if max_memory and not (max_memory.isdigit() and int(max_memory) > 0):
+            messagebox.showwarning("Invalid Memory Limit", "Max MB must be a whole number of megabytes.")
+            return
+
+        try:
+            matte = parse_matte(self.matte_var.get())
+        except ValueError as e:
+            messagebox.showwarning("Invalid Matte", str(e))
+            return
+
+        options = ConvertOptions(resize=resize, max_memory_mb=int(max_memory) if max_memory else None,
+                                 profile=self.profile_var.get(), strip_metadata=self.strip_var.get(),
+                                 matte=matte)
         
         # Disable button during conversion
         self.convert_btn.config(state='disabled', bg=self.bg_dark)
+        self.cancel_btn.config(state='normal', bg=self.purple_dark, fg=self.text_primary)
         self.status_label.config(text="⏳ Converting...", fg=self.purple_light)
-        self.root.update()
-        
+        self.rate_label.config(text="")
+
+        cache = ConversionCache() if self.cache_var.get() else None
+        depths = QueueDepths(DEFAULT_READ_AHEAD, None, DEFAULT_WRITE_BEHIND) if self.overlap_io_var.get() else None
+        check_first = self.preflight_var.get()
+
+        self.cancel_event.clear()
+        if mode == "single":
+            target, args = self.convert_single_file, (self.selected_files[0], output_formats, options)
+        elif mode == "folder":
+            target, args = self.convert_folder, (self.selected_files[0], output_formats,
+                                                 workers, self.incremental_var.get(), options, cache, depths,
+                                                 check_first)
+        else:
+            target, args = self.convert_batch_files, (list(self.selected_files), output_formats,
+                                                      workers, self.incremental_var.get(), options, cache,
+                                                      depths, check_first)
+        self.worker = threading.Thread(target=self.run_worker, args=(target, args), daemon=True)
+        self.worker.start()
+        self.root.after(100, self.poll_progress)
+
+    def cancel_conversion(self):
+        self.cancel_event.set()
+        self.cancel_btn.config(state='disabled', bg=self.bg_dark)
+        self.status_label.config(text="⏳ Cancelling...", fg=self.purple_light)
+
+    def run_worker(self, target, args):
+        """Background thread body. Never touches Tk widgets directly."""
         try:
-            if mode == "single":
-                self.convert_single_file(self.selected_files[0], output_format)
-            else:
-                self.convert_batch_files(self.selected_files, output_format)
+            target(*args)
         except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {str(e)}")
-            self.status_label.config(text="❌ Conversion failed!", fg="#ef4444")
-        finally:
+            self.progress_queue.put(('error', str(e)))
+
+    def poll_progress(self):
+        """Apply queued worker messages to the UI, then reschedule while running."""
+        finished = False
+        try:
+            while True:
+                message = self.progress_queue.get_nowait()
+                kind = message[0]
+                if kind == 'progress':
+                    _, done, total, rate = message
+                    counter = f"{done}/{total}" if total else f"{done}"
+                    self.status_label.config(text=f"⏳ Converting {counter}...", fg=self.purple_light)
+                    self.rate_label.config(text=rate)
+                elif kind == 'status':
+                    self.status_label.config(text=message[1], fg=self.purple_light)
+                elif kind == 'single_done':
+                    finished = True
+                    self.show_single_result(message[1])
+                elif kind == 'batch_done':
+                    finished = True
+                    self.show_batch_result(*message[1:])
+                elif kind == 'error':
+                    finished = True
+                    messagebox.showerror("Error", f"An error occurred: {message[1]}")
+                    self.status_label.config(text="❌ Conversion failed!", fg="#ef4444")
+        except queue.Empty:
+            pass
+
+        if finished or not self.worker.is_alive() and self.progress_queue.empty():
             self.convert_btn.config(state='normal', bg=self.purple_main)
-    
-    def convert_single_file(self, filepath, output_format):
-        # Open image
-        img = Image.open(filepath)
-        
-        # Convert RGBA to RGB if saving as JPEG
-        if output_format in ['JPG', 'JPEG'] and img.mode == 'RGBA':
-            img = img.convert('RGB')
-        
-        # Get output path
-        file_path = Path(filepath)
-        output_path = file_path.parent / f"{file_path.stem}.{output_format.lower()}"
-        
-        # Save image
-        if output_format in ['JPG', 'JPEG']:
-            img.save(output_path, 'JPEG', quality=95)
+            self.cancel_btn.config(state='disabled', bg=self.bg_dark, fg=self.text_secondary)
         else:
-            img.save(output_path, output_format)
-        
-        self.status_label.config(text=f"Converted successfully to {output_path.name}", 
+            self.root.after(100, self.poll_progress)
+    
+    def convert_single_file(self, filepath, output_formats, options=None):
+        if len(output_formats) == 1:
+            output_path = convert_file(filepath, output_formats[0],
+                                       output_path_for(filepath, output_formats[0]), options)
+            self.progress_queue.put(('single_done', [output_path]))
+            return
+
+        outputs = [(Target(fmt), output_path_for(filepath, fmt)) for fmt in output_formats]
+        errors = convert_file_multi(filepath, outputs, options)
+        failed = [f"{output_path.name}: {error}" for output_path, error in errors.items() if error]
+        if failed:
+            raise RuntimeError("\n".join(failed))
+        self.progress_queue.put(('single_done', [output_path for _, output_path in outputs]))
+
+    def show_single_result(self, output_paths):
+        names = ", ".join(output_path.name for output_path in output_paths)
+        self.status_label.config(text=f"Converted successfully to {names}", 
                                 fg=self.accent)
-        messagebox.showinfo("Success", f"✓ Image converted successfully!\n\nSaved to:\n{output_path}")
+        saved = "\n".join(str(output_path) for output_path in output_paths)
+        messagebox.showinfo("Success", f"✓ Image converted successfully!\n\nSaved to:\n{saved}")
     
-    def convert_batch_files(self, filepaths, output_format):
-        # Create output folder in the same directory as the first file
-        first_file_dir = Path(filepaths[0]).parent
-        output_folder = first_file_dir / f"converted_{output_format.lower()}"
-        output_folder.mkdir(exist_ok=True)
+    def convert_folder(self, folder, output_formats, workers, incremental=False, options=None, cache=None,
+                       depths=None, check_first=False):
+        # Outputs mirror the source tree inside the folder itself
+        folder_name = "converted" if len(output_formats) > 1 else f"converted_{output_formats[0].lower()}"
+        output_folder = os.path.join(folder, folder_name)
+        files = iter_images(folder, exclude=[output_folder])
+        self.convert_batch_files(files, output_formats, workers, incremental, options, cache, depths,
+                                 check_first, output_folder=output_folder, source_root=folder)
+
+    def convert_batch_files(self, filepaths, output_formats, workers, incremental=False, options=None,
+                            cache=None, depths=None, check_first=False, output_folder=None, source_root=None):
+        multi = len(output_formats) > 1
+
+        # Output folder sits in the same directory as the first file
+        if output_folder is None:
+            if multi:
+                output_folder = os.path.join(os.path.dirname(filepaths[0]), "converted")
+            else:
+                output_folder = default_output_folder(filepaths, output_formats[0])
+        total = len(filepaths) * len(output_formats) if isinstance(filepaths, list) else None
+
+        flagged = []
+        if check_first:
+            self.progress_queue.put(('status', "⏳ Checking files..."))
+            report = preflight(filepaths, [Target(fmt) for fmt in output_formats], options)
+            self.progress_queue.put(('status', f"⏳ {report.summary()}"))
+            filepaths = report.largest_first()
+            flagged = report.failures()
+            total = len(report.ok) * len(output_formats) + len(report.bad)
+
+        if multi:
+            # One subfolder per format; incremental mode, the cache and I/O overlap apply to single-format runs
+            results = iter_convert_multi(filepaths, [Target(fmt) for fmt in output_formats], output_folder,
+                                         workers, self.cancel_event, options, source_root)
+        else:
+            results = iter_convert(filepaths, output_formats[0], output_folder, workers, self.cancel_event,
+                                   incremental, options, source_root, cache=cache, depths=depths)
         
         success_count = 0
+        skipped_count = 0
         failed_files = []
-        
-        for i, filepath in enumerate(filepaths, 1):
-            try:
-                # Update status
-                self.status_label.config(text=f"⏳ Converting {i}/{len(filepaths)}...", fg=self.purple_light)
-                self.root.update()
-                
-                # Open image
-                img = Image.open(filepath)
-                
-                # Convert RGBA to RGB if saving as JPEG
-                if output_format in ['JPG', 'JPEG'] and img.mode == 'RGBA':
-                    img = img.convert('RGB')
-                
-                # Get output path
-                file_path = Path(filepath)
-                output_path = output_folder / f"{file_path.stem}.{output_format.lower()}"
-                
-                # Save image
-                if output_format in ['JPG', 'JPEG']:
-                    img.save(output_path, 'JPEG', quality=95)
-                else:
-                    img.save(output_path, output_format)
-                
+        throughput = Throughput()
+        stage_stats = StageStats()
+
+        for i, result in enumerate(itertools.chain(flagged, results), 1):
+            throughput.add(result)
+            stage_stats.merge(result.stats)
+            if result.error is None:
                 success_count += 1
-            except Exception as e:
-                failed_files.append((os.path.basename(filepath), str(e)))
-        
+                skipped_count += result.skipped
+            else:
+                failed_files.append((os.path.basename(result.filepath), result.error))
+
+            self.progress_queue.put(('progress', i, total, str(throughput)))
+
+        self.progress_queue.put(('batch_done', success_count, skipped_count, total or throughput.files,
+                                 output_folder, failed_files, self.cancel_event.is_set(),
+                                 str(throughput), stage_stats.short_summary()))
+
+    def show_batch_result(self, success_count, skipped_count, total, output_folder,
+                          failed_files, cancelled, rate, stage_summary=""):
         # Show results
-        result_msg = f"✓ Converted {success_count} out of {len(filepaths)} files.\n\n"
+        result_msg = f"✓ Converted {success_count} out of {total} files.\n\n"
+        if cancelled:
+            result_msg = f"⚠ Cancelled after converting {success_count} out of {total} files.\n\n"
+        if skipped_count:
+            result_msg += f"{skipped_count} were already up to date.\n\n"
         result_msg += f"Output folder:\n{output_folder}"
+        if stage_summary:
+            result_msg += f"\n\nTime spent: {stage_summary}"
         
         if failed_files:
             result_msg += f"\n\n❌ Failed files:\n"
             for filename, error in failed_files[:5]:  # Show first 5 errors
                 result_msg += f"• {filename}: {error}\n"
         
-        self.status_label.config(text=f"Batch conversion complete: {success_count}/{len(filepaths)}", 
+        self.status_label.config(text=f"Batch conversion complete: {success_count}/{total}", 
                                 fg=self.accent)
+        self.rate_label.config(text=rate)
         messagebox.showinfo("Batch Conversion Complete", result_msg)
 
 def main():
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = ImageConverterApp(root)
     root.mainloop()
@@ -0,0 +1,212 @@
+"""Byte-level fast path for sources that already are in the target format.
+
+Nothing here decodes pixels: files are copied with the kernel's copy
+primitives, and metadata stripping edits JPEG segments / PNG chunks.
+Before a copy, is_complete walks the container so a truncated or damaged
+source goes to the decoder (and fails there) instead of being copied.
+"""
+import io
+import mmap
+import os
+import shutil
+import struct
+import zlib
+
+from PIL import Image, ImageSequence
+
+# PNG ancillary chunks that only carry metadata
+PNG_METADATA_CHUNKS = {b'tEXt', b'zTXt', b'iTXt', b'tIME', b'eXIf'}
+
+# JPEG APPn markers worth keeping: APP0 JFIF, APP2 ICC profile, APP14 Adobe colour transform
+JPEG_KEEP_MARKERS = {0xE0, 0xE2, 0xEE}
+EXIF_ORIENTATION = 0x0112
+
+
+def copy_bytes(source, target):
+    """Copy source to target in the kernel where possible (copy_file_range, then sendfile)."""
+    if hasattr(os, 'copy_file_range'):
+        try:
+            with open(source, 'rb') as fsrc, open(target, 'wb') as fdst:
+                remaining = os.fstat(fsrc.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                if remaining == 0:
+                    return
+        except OSError:
+            pass  # e.g. EXDEV on older kernels; fall back below
+    # shutil uses sendfile on Linux and fcopyfile on macOS
+    shutil.copyfile(source, target)
+
+
+def png_complete(data):
+    """Every chunk is whole with a matching CRC, up to IEND."""
+    view = memoryview(data)
+    pos = 8
+    while pos + 12 <= len(data):
+        length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+        end = pos + 12 + length
+        if end > len(data):
+            return False
+        crc, = struct.unpack('>I', data[end - 4:end])
+        if zlib.crc32(view[pos + 4:end - 4]) != crc:
+            return False
+        if chunk_type == b'IEND':
+            return True
+        pos = end
+    return False
+
+
+def jpeg_complete(data):
+    """An end-of-image marker follows the start of scan (a cut-off scan has none)."""
+    scan = data.find(b'\xff\xda')
+    return scan != -1 and data.rfind(b'\xff\xd9') > scan
+
+
+def webp_complete(data):
+    """The file is as long as its RIFF header says."""
+    size, = struct.unpack('<I', data[4:8])
+    return len(data) >= size + 8
+
+
+def bmp_complete(data):
+    """The file is as long as its header says and its pixel data starts inside it."""
+    size, _, offset = struct.unpack('<IIi', data[2:14])
+    return len(data) >= size and 14 <= offset < len(data)
+
+
+def gif_complete(data):
+    """Every block and sub-block is whole, up to the GIF trailer."""
+    def skip_table(pos, flags):
+        return pos + (3 << ((flags & 0x07) + 1) if flags & 0x80 else 0)
+
+    def skip_sub_blocks(pos):
+        while data[pos]:
+            pos += data[pos] + 1
+        return pos + 1
+
+    pos = skip_table(13, data[10])
+    while True:
+        block = data[pos]
+        if block == 0x3B:
+            return True
+        if block == 0x21:  # extension: label, then sub-blocks
+            pos = skip_sub_blocks(pos + 2)
+        elif block == 0x2C:  # image: descriptor, local colour table, LZW code size, sub-blocks
+            pos = skip_sub_blocks(skip_table(pos + 10, data[pos + 9]) + 1)
+        else:
+            return False
+
+
+def ico_complete(data):
+    """Every icon the directory lists lies inside the file."""
+    count, = struct.unpack('<H', data[4:6])
+    for index in range(count):
+        entry = 6 + 16 * index
+        if entry + 16 > len(data):
+            return False
+        size, offset = struct.unpack('<II', data[entry + 8:entry + 16])
+        if offset + size > len(data):
+            return False
+    return count > 0
+
+
+def tiff_complete(data):
+    """Every strip or tile of every page lies inside the file."""
+    with Image.open(io.BytesIO(data) if isinstance(data, bytes) else data) as img:
+        for page in ImageSequence.Iterator(img):
+            tags = page.tag_v2
+            offsets = tags.get(273) or tags.get(324) or ()
+            counts = tags.get(279) or tags.get(325) or ()
+            if len(offsets) != len(counts):
+                return False
+            if any(offset + count > len(data) for offset, count in zip(offsets, counts)):
+                return False
+    return True
+
+
+COMPLETENESS_CHECKS = {
+    'PNG': png_complete,
+    'JPEG': jpeg_complete,
+    'WEBP': webp_complete,
+    'BMP': bmp_complete,
+    'GIF': gif_complete,
+    'ICO': ico_complete,
+    'TIFF': tiff_complete,
+}
+
+
+def is_complete(filepath, codec, data=None):
+    """True when the source (data, or else the file mapped into memory) is a
+    whole codec file. Anything that can't be checked or parsed counts as
+    damaged, so the caller falls back to a real decode."""
+    check = COMPLETENESS_CHECKS.get(codec)
+    if check is None:
+        return False
+    try:
+        if data is not None:
+            return check(data)
+        with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return check(mapped)
+    except Exception:  # struct.error, OSError, ValueError, Pillow's SyntaxError...
+        return False
+
+
+def strip_png(data):
+    """Drop text, time and EXIF chunks from PNG bytes; pixels stay untouched."""
+    out = [data[:8]]
+    pos = 8
+    while pos + 8 <= len(data):
+        length, chunk_type = struct.unpack('>I4s', data[pos:pos + 8])
+        end = pos + 12 + length
+        if chunk_type not in PNG_METADATA_CHUNKS:
+            out.append(data[pos:end])
+        pos = end
+        if chunk_type == b'IEND':
+            break
+    return b''.join(out)
+
+
+def strip_jpeg(data, keep_exif=False):
+    """Drop comment and APPn segments (EXIF, XMP, ...) from JPEG bytes.
+
+    The entropy-coded scan is copied verbatim, so this is lossless. With
+    keep_exif the APP1 segments are kept (used when EXIF carries a
+    non-default orientation that viewers need).
+    """
+    out = [data[:2]]
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            break
+        marker = data[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == 0xDA:  # start of scan: the rest is image data
+            out.append(data[pos:])
+            return b''.join(out)
+        length = struct.unpack('>H', data[pos + 2:pos + 4])[0]
+        end = pos + 2 + length
+        is_app = 0xE0 <= marker <= 0xEF
+        drop = marker == 0xFE or (is_app and marker not in JPEG_KEEP_MARKERS
+                                  and not (keep_exif and marker == 0xE1))
+        if not drop:
+            out.append(data[pos:end])
+        pos = end
+    # Not a layout we understand; leave the file alone
+    return data
+
+
+def strip_metadata(data, codec):
+    """Return JPEG or PNG bytes with metadata removed; other codecs come back unchanged."""
+    if codec == 'PNG':
+        return strip_png(data)
+    if codec == 'JPEG':
+        with Image.open(io.BytesIO(data)) as img:
+            orientation = img.getexif().get(EXIF_ORIENTATION, 1)
+        return strip_jpeg(data, keep_exif=orientation != 1)
+    return data
+
@@ -0,0 +1,109 @@
+"""Per-stage timers and counters for the conversion pipeline."""
+import cProfile
+import os
+import pstats
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+STAGES = ('open', 'decode', 'convert', 'encode', 'write')
+
+
+class StageStats:
+    """Seconds spent per stage plus bytes and pixel counters.
+
+    One instance is filled per file inside the worker; its as_dict() rides
+    back on the ConvertResult and the batch merges them for the summary.
+    """
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.files = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.pixels = 0
+        self.passthrough = 0
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+
+    def as_dict(self):
+        return {'seconds': dict(self.seconds), 'files': self.files, 'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out, 'pixels': self.pixels, 'passthrough': self.passthrough}
+
+    def merge(self, stats):
+        """Add a worker's as_dict() into this total."""
+        if not stats:
+            return
+        for name, seconds in stats['seconds'].items():
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+        self.files += stats['files']
+        self.bytes_in += stats['bytes_in']
+        self.bytes_out += stats['bytes_out']
+        self.pixels += stats['pixels']
+        self.passthrough += stats.get('passthrough', 0)
+
+    def shares(self):
+        """Fraction of worker time per stage."""
+        total = sum(self.seconds.values()) or 1e-9
+        return {name: seconds / total for name, seconds in self.seconds.items()}
+
+    def short_summary(self):
+        """One-line 'decode 40% · encode 45% ...' for the GUI."""
+        shares = sorted(self.shares().items(), key=lambda item: -item[1])
+        return " · ".join(f"{name} {share:.0%}" for name, share in shares if share >= 0.005)
+
+    def table(self):
+        """Multi-line summary table of where worker time went."""
+        total = sum(self.seconds.values())
+        lines = [f"{'stage':<10} {'seconds':>10} {'share':>7} {'ms/file':>9}"]
+        for name, seconds in self.seconds.items():
+            share = seconds / total if total else 0
+            per_file = seconds * 1000 / self.files if self.files else 0
+            lines.append(f"{name:<10} {seconds:>10.3f} {share:>7.1%} {per_file:>9.2f}")
+        lines.append(f"{'total':<10} {total:>10.3f} {'':>7} "
+                     f"{(total * 1000 / self.files if self.files else 0):>9.2f}")
+        mb = 1024 * 1024
+        lines.append(f"files {self.files} · in {self.bytes_in / mb:.1f} MB · out {self.bytes_out / mb:.1f} MB"
+                     f" · {self.pixels / 1e6:.1f} Mpixels · {self.passthrough} passed through")
+        if total:
+            lines.append(f"worker rates: {self.bytes_in / mb / total:.1f} MB/s in, "
+                         f"{self.pixels / 1e6 / total:.1f} Mpixels/s")
+        return "\n".join(lines)
+
+
+@contextmanager
+def profiled(profile_dir):
+    """Run the block under cProfile and dump it to profile_dir (no-op when None)."""
+    if not profile_dir:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        Path(profile_dir).mkdir(parents=True, exist_ok=True)
+        part = Path(profile_dir) / f"part-{os.getpid()}-{time.perf_counter_ns()}.prof"
+        profiler.dump_stats(part)
+
+
+def merge_profiles(profile_dir, output_name=None):
+    """Combine the per-file dumps in profile_dir into one run-<time>.prof."""
+    parts = sorted(Path(profile_dir).glob('part-*.prof'))
+    if not parts:
+        return None
+    stats = pstats.Stats(str(parts[0]))
+    for part in parts[1:]:
+        stats.add(str(part))
+    output = Path(profile_dir) / (output_name or f"run-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+    stats.dump_stats(output)
+    for part in parts:
+        part.unlink()
+    return output
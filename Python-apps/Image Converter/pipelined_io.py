@@ -0,0 +1,145 @@
+"""Read-ahead and write-behind file I/O, so batches overlap I/O with encoding.
+
+On a network share much of a conversion is spent blocked on reads and
+writes while the CPU idles. read_ahead() fetches the next sources into
+memory on I/O threads while the workers encode, and WriteBehind flushes
+finished outputs while the next files decode. Both are bounded by a queue
+depth so memory use stays predictable.
+"""
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+DEFAULT_READ_AHEAD = 8
+DEFAULT_WRITE_BEHIND = 8
+IO_THREADS = 4
+
+
+@dataclass(frozen=True)
+class QueueDepths:
+    """How many files each batch stage may hold at once.
+
+    read_ahead is the number of sources read into memory ahead of the
+    workers (0 lets workers read their own files). in_flight caps files
+    queued on the worker pool (None means four per worker). write_behind
+    is the number of encoded outputs waiting to be flushed (0 lets workers
+    write their own outputs).
+    """
+    read_ahead: int = 0
+    in_flight: int = None
+    write_behind: int = 0
+
+
+@contextmanager
+def atomic_output(output_path):
+    """Yield a temp path next to output_path and rename it into place on success,
+    so a reader (or a cache hardlink to the previous output) never sees a
+    half-written file."""
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(f".{output_path.name}.{os.getpid()}.tmp")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if tmp_path.exists():
+            tmp_path.unlink()
+        raise
+
+
+def write_output(output_path, data):
+    """Write data to output_path atomically (temp file + rename)."""
+    with atomic_output(output_path) as tmp_path:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+
+
+def read_file(filepath):
+    with open(filepath, 'rb') as f:
+        return f.read()
+
+
+def read_ahead(items, depth, path_of=None):
+    """Yield (item, data) for items in order while up to depth reads run ahead.
+
+    path_of maps an item to the file to read (default: the item itself);
+    items it maps to None are passed along with data None and not read.
+    A failed read also yields None, leaving the error to whoever opens the
+    file next. Items are only pulled from the iterable as the window frees up.
+    """
+    path_of = path_of or (lambda item: item)
+    items = iter(items)
+    end = object()
+    queue = deque()
+    pool = ThreadPoolExecutor(max_workers=min(IO_THREADS, depth), thread_name_prefix='read-ahead')
+    try:
+        while True:
+            while len(queue) < depth:
+                item = next(items, end)
+                if item is end:
+                    break
+                path = path_of(item)
+                queue.append((item, pool.submit(read_file, path) if path is not None else None))
+            if not queue:
+                return
+            item, future = queue.popleft()
+            try:
+                data = future.result() if future is not None else None
+            except OSError:
+                data = None
+            yield item, data
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+class WriteBehind:
+    """Flush encoded outputs on background threads, at most depth at a time.
+
+    submit() blocks while depth writes are already queued, which keeps the
+    encoders from running arbitrarily far ahead of a slow disk. Finished
+    writes come back from completed() tagged with whatever the caller
+    submitted them with.
+    """
+
+    def __init__(self, depth):
+        self.depth = max(1, depth)
+        self.pool = ThreadPoolExecutor(max_workers=min(IO_THREADS, self.depth),
+                                       thread_name_prefix='write-behind')
+        self.pending = {}
+
+    def __len__(self):
+        return len(self.pending)
+
+    def submit(self, tag, output_path, data, then=None):
+        """Queue data for output_path; then, if given, runs after a successful write."""
+        # Finished writes no longer hold their data; only unfinished ones count
+        unfinished = [future for future in self.pending if not future.done()]
+        if len(unfinished) >= self.depth:
+            wait(unfinished, return_when=FIRST_COMPLETED)
+        self.pending[self.pool.submit(self._write, output_path, data, then)] = tag
+
+    @staticmethod
+    def _write(output_path, data, then):
+        start = time.perf_counter()
+        write_output(output_path, data)
+        if then is not None:
+            then()
+        return time.perf_counter() - start
+
+    def completed(self, wait_all=False):
+        """Yield (tag, error or None, seconds) for finished writes; with wait_all, for every write."""
+        if wait_all and self.pending:
+            wait(self.pending)
+        for future in [future for future in self.pending if future.done()]:
+            tag = self.pending.pop(future)
+            try:
+                yield tag, None, future.result()
+            except Exception as e:
+                yield tag, str(e), 0.0
+
+    def close(self):
+        """Wait for queued writes to land and stop the threads."""
+        self.pool.shutdown(wait=True)
@@ -0,0 +1,152 @@
+"""Header-only pre-flight pass over a batch, run before anything is encoded.
+
+Each file is opened just far enough to read its format, size, mode and
+frame count. That is enough to flag corrupt, unsupported or over-limit
+files up front, to estimate how many pixels the batch will decode and how
+much it will write, and to hand the workers the biggest jobs first so the
+slowest file does not start last.
+"""
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from converter_engine import (ConvertResult, converted_bytes, frame_bytes, passthrough_codec, pixel_limit,
+                              target_size)
+from encoder_profiles import pil_format, save_params
+from fanout import target_options
+
+# Header reads are mostly waiting on storage, so threads overlap them well
+PROBE_THREADS = 16
+
+# Rough encoded bytes per output pixel for compressed codecs; only used to size a batch
+BYTES_PER_PIXEL = {'JPEG': 0.35, 'WEBP': 0.25, 'PNG': 1.6, 'GIF': 0.5, 'TIFF': 1.6}
+CHANNELS = {'1': 1, 'L': 1, 'P': 1, 'LA': 2, 'RGB': 3, 'RGBA': 4, 'CMYK': 4}
+
+# What one file costs: work is the number of pixels to decode (0 when the
+# file is copied through), bytes_out the estimated output size over all targets
+Probe = namedtuple('Probe', 'filepath format size mode frames bytes_in work bytes_out error',
+                   defaults=(None,))
+
+
+def decoded_size(probe, size, options):
+    """Size the decoder produces for output size; JPEG drafts by powers of two."""
+    width, height = probe.size
+    if probe.format != 'JPEG' or options.resize is None:
+        return probe.size
+    scale = 1
+    while scale < 8 and width // (scale * 2) >= size[0] and height // (scale * 2) >= size[1]:
+        scale *= 2
+    return -(-width // scale), -(-height // scale)
+
+
+def output_bytes(output_format, size, mode, frames, options):
+    """Estimated encoded size of one target."""
+    codec = pil_format(output_format)
+    pixels = size[0] * size[1]
+    channels = CHANNELS.get(mode, 3)
+    if codec == 'BMP':
+        # Greyscale with alpha is written as RGBA
+        return pixels * (4 if channels == 2 else channels) + 54
+    if codec == 'ICO':
+        # Pillow writes sizes up to 256x256
+        return min(size[0], 256) * min(size[1], 256) * 4
+    frames = frames if codec in ('GIF', 'WEBP', 'PNG', 'TIFF') else 1
+    if codec == 'TIFF' and save_params(codec, options.profile).get('compression', 'raw') == 'raw':
+        return pixels * channels * frames
+    return int(pixels * BYTES_PER_PIXEL.get(codec, channels) * frames)
+
+
+def read_header(filepath, options=None):
+    """(format, size, mode, frames) of filepath, read without decoding any pixels.
+
+    Headers are read under Pillow's own pixel limit so the probe threads run
+    in parallel. Only a file over that limit, in a job with a memory ceiling
+    (which probe checks itself), is reopened with the limit lifted.
+    """
+    try:
+        with Image.open(filepath) as img:
+            return img.format, img.size, img.mode, getattr(img, 'n_frames', 1)
+    except Image.DecompressionBombError:
+        if options is None or not options.max_memory_mb:
+            raise
+    with pixel_limit(options), Image.open(filepath) as img:
+        return img.format, img.size, img.mode, getattr(img, 'n_frames', 1)
+
+
+def probe(filepath, targets, options=None):
+    """Read filepath's header and estimate converting it to every Target in targets."""
+    try:
+        bytes_in = os.path.getsize(filepath)
+        fmt, size, mode, frames = read_header(filepath, options)
+    except Exception as e:  # Pillow raises OSError, SyntaxError, ValueError... for bad files
+        return Probe(filepath, None, None, None, 0, 0, 0, 0, str(e) or type(e).__name__)
+
+    result = Probe(filepath, fmt, size, mode, frames, bytes_in, 0, 0)
+    work = 0
+    bytes_out = 0
+    for target in targets:
+        per_target = target_options(target, options)
+        if passthrough_codec(filepath, target.output_format, per_target) is not None:
+            bytes_out += bytes_in
+            continue
+
+        out_size = target_size(size, per_target.resize) if per_target.resize else size
+        decoded = decoded_size(result, out_size, per_target)
+        if per_target.max_memory_mb:
+            needed = frame_bytes(mode, decoded) + converted_bytes(mode, decoded, out_size,
+                                                                  target.output_format, per_target.matte)
+            if needed > per_target.max_memory_mb * 1024 * 1024:
+                return result._replace(error=f"{size[0]}x{size[1]} {mode} needs about "
+                                             f"{needed // (1024 * 1024)} MB, over the "
+                                             f"{per_target.max_memory_mb} MB limit")
+        work = max(work, decoded[0] * decoded[1] * frames)
+        bytes_out += output_bytes(target.output_format, out_size, mode, frames, per_target)
+    return result._replace(work=work, bytes_out=bytes_out)
+
+
+class PreflightReport:
+    """Probes for a whole batch, split into convertible and flagged files."""
+
+    def __init__(self, probes):
+        self.probes = probes
+        self.ok = [probe for probe in probes if probe.error is None]
+        self.bad = [probe for probe in probes if probe.error is not None]
+
+    @property
+    def work(self):
+        return sum(probe.work for probe in self.ok)
+
+    @property
+    def bytes_in(self):
+        return sum(probe.bytes_in for probe in self.ok)
+
+    @property
+    def bytes_out(self):
+        return sum(probe.bytes_out for probe in self.ok)
+
+    def largest_first(self):
+        """Convertible files, biggest decode first, so the pool drains evenly."""
+        ordered = sorted(self.ok, key=lambda probe: (probe.work, probe.bytes_in), reverse=True)
+        return [probe.filepath for probe in ordered]
+
+    def failures(self):
+        """A failed ConvertResult per flagged file, for batch summaries."""
+        return [ConvertResult(probe.filepath, None, probe.error, 0) for probe in self.bad]
+
+    def summary(self):
+        mb = 1024 * 1024
+        return (f"{len(self.ok)} files ok, {len(self.bad)} flagged · {self.work / 1e6:.1f} Mpixels to decode"
+                f" · {self.bytes_in / mb:.1f} MB in, about {self.bytes_out / mb:.1f} MB out")
+
+
+def preflight(filepaths, targets, options=None, threads=PROBE_THREADS):
+    """Probe every file in filepaths on a thread pool and return a PreflightReport.
+
+    targets is a list of fanout.Target; a single-format batch passes [Target(fmt)].
+    """
+    targets = list(targets)
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        probes = list(pool.map(lambda filepath: probe(filepath, targets, options), filepaths))
+    return PreflightReport(probes)
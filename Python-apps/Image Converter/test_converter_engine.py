@@ -0,0 +1,129 @@
+"""Run with: python -m pytest"""
+import json
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+import pipelined_io
+from conversion_cache import ConversionCache
+from conversion_manifest import MANIFEST_NAME
+from converter_engine import ConvertOptions, convert_file, converted_bytes, iter_convert, pixel_limit
+from pipelined_io import QueueDepths
+
+
+@pytest.fixture
+def low_pixel_limit(monkeypatch):
+    """Pillow's bomb check at 1000 pixels, so small test images trip it."""
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+
+
+def save(path, size=(64, 48), mode='RGB'):
+    Image.effect_noise(size, 40).convert(mode).save(path)
+    return str(path)
+
+
+def test_pixel_limit_only_lifted_inside(low_pixel_limit):
+    with pixel_limit(ConvertOptions()):
+        assert Image.MAX_IMAGE_PIXELS == 1000
+    with pixel_limit(ConvertOptions(max_memory_mb=64)):
+        assert Image.MAX_IMAGE_PIXELS is None
+    assert Image.MAX_IMAGE_PIXELS == 1000
+
+
+def test_pixel_limit_restored_after_error(low_pixel_limit):
+    with pytest.raises(RuntimeError):
+        with pixel_limit(ConvertOptions(max_memory_mb=64)):
+            raise RuntimeError
+    assert Image.MAX_IMAGE_PIXELS == 1000
+
+
+def test_pixel_limit_restored_after_concurrent_jobs(low_pixel_limit):
+    options = ConvertOptions(max_memory_mb=64)
+    seen = []
+
+    def job():
+        with pixel_limit(options):
+            seen.append(Image.MAX_IMAGE_PIXELS)
+            time.sleep(0.01)
+
+    threads = [threading.Thread(target=job) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert seen == [None] * 8
+    assert Image.MAX_IMAGE_PIXELS == 1000
+
+
+def test_memory_ceiling_replaces_pixel_limit(tmp_path, low_pixel_limit):
+    source = save(tmp_path / "big.png", (100, 100))
+    with pytest.raises(Image.DecompressionBombError):
+        convert_file(source, 'BMP', tmp_path / "a.bmp")
+    convert_file(source, 'BMP', tmp_path / "b.bmp", ConvertOptions(max_memory_mb=64))
+    assert Image.MAX_IMAGE_PIXELS == 1000
+
+
+def test_converted_bytes_counts_only_real_copies():
+    assert converted_bytes('RGB', (100, 100), (100, 100), 'PNG') == 0
+    assert converted_bytes('RGB', (100, 100), (50, 50), 'PNG') == 50 * 50 * 4
+    assert converted_bytes('RGBA', (100, 100), (100, 100), 'JPG') == 100 * 100 * 4
+    assert converted_bytes('L', (100, 100), (100, 100), 'WEBP') == 100 * 100 * 4
+
+
+def test_memory_ceiling_accepts_a_file_that_fits(tmp_path):
+    # 4 MB decoded, no copy needed: fits 6 MB, where a second RGBA frame would not
+    source = save(tmp_path / "photo.png", (1000, 1000))
+    options = ConvertOptions(max_memory_mb=6, passthrough=False)
+    convert_file(source, 'BMP', tmp_path / "photo.bmp", options)
+    with pytest.raises(MemoryError):
+        convert_file(source, 'BMP', tmp_path / "small.bmp", ConvertOptions(max_memory_mb=6, resize=('scale', 90.0)))
+
+
+def test_truncated_source_is_not_passed_through(tmp_path):
+    source = tmp_path / "cut.png"
+    data = open(save(tmp_path / "whole.png"), 'rb').read()
+    source.write_bytes(data[:len(data) // 2])
+    with pytest.raises(OSError):
+        convert_file(str(source), 'PNG', tmp_path / "out.png")
+    assert not (tmp_path / "out.png").exists()
+
+
+def test_incremental_skips_unchanged_sources(tmp_path):
+    sources = [save(tmp_path / f"{i}.png") for i in range(3)]
+    first = list(iter_convert(sources, 'JPG', tmp_path / "out", 2, incremental=True))
+    second = list(iter_convert(sources, 'JPG', tmp_path / "out", 2, incremental=True))
+    assert [result.skipped for result in first] == [False] * 3
+    assert [result.skipped for result in second] == [True] * 3
+
+
+def test_cancelled_write_behind_outputs_are_in_manifest(tmp_path, monkeypatch):
+    sources = [save(tmp_path / f"{i:02d}.png", (200, 200)) for i in range(16)]
+    slow_write = pipelined_io.write_output
+    monkeypatch.setattr(pipelined_io, 'write_output', lambda *args: (time.sleep(0.2), slow_write(*args))[1])
+
+    output_folder = tmp_path / "out"
+    cancel_event = threading.Event()
+    results = iter_convert(sources, 'JPG', output_folder, 2, cancel_event, incremental=True,
+                           depths=QueueDepths(write_behind=4))
+    next(results)
+    cancel_event.set()
+    list(results)
+
+    written = {str(path) for path in output_folder.glob("*.jpg")}
+    with open(output_folder / MANIFEST_NAME, encoding='utf-8') as f:
+        recorded = {entry['output'] for entry in json.load(f)['files'].values()}
+    assert len(written) > 1
+    assert recorded == written
+
+
+@pytest.mark.parametrize('depths', [None, QueueDepths(read_ahead=2, write_behind=2)])
+def test_cache_skips_passthroughs_and_serves_hits(tmp_path, depths):
+    sources = [save(tmp_path / "a.png"), save(tmp_path / "b.jpg")]
+    cache = ConversionCache(tmp_path / "cache")
+    list(iter_convert(sources, 'PNG', tmp_path / "out1", 2, cache=cache, depths=depths))
+    assert len([path for path in (tmp_path / "cache").rglob("*.png")]) == 1
+
+    results = list(iter_convert(sources, 'PNG', tmp_path / "out2", 2, cache=cache, depths=depths))
+    assert sorted(result.cached for result in results) == [False, True]
@@ -0,0 +1,40 @@
+"""Run with: python -m pytest"""
+import struct
+import zlib
+from pathlib import Path
+
+from PIL import Image
+
+from converter_engine import ConvertOptions
+from fanout import Target, convert_file_multi, convert_to_targets
+
+
+def test_shared_decode_encodes_every_target(tmp_path):
+    source = tmp_path / "photo.png"
+    Image.new('RGB', (64, 48), (200, 120, 40)).save(source)
+    options = ConvertOptions(profile='smallest')
+    expected = {'JPG': 'JPEG', 'WEBP': 'WEBP', 'TIFF': 'TIFF'}
+
+    # The encoders run in parallel threads over one decoded image; repeat to catch races
+    for attempt in range(10):
+        outputs = [(Target(fmt), tmp_path / f"{attempt}.{fmt.lower()}") for fmt in expected]
+        errors = convert_file_multi(str(source), outputs, options)
+
+        assert errors == {output_path: None for _, output_path in outputs}
+        for target, output_path in outputs:
+            with Image.open(output_path) as img:
+                assert img.format == expected[target.output_format]
+                assert img.size == (64, 48)
+
+
+def test_open_failure_keeps_passed_through_targets(tmp_path):
+    source = tmp_path / "in" / "bad.png"
+    source.parent.mkdir()
+    # A well-formed PNG container with no IHDR: copied as is for PNG, but Pillow can't open it
+    source.write_bytes(b'\x89PNG\r\n\x1a\n' + struct.pack('>I4sI', 0, b'IEND', zlib.crc32(b'IEND')))
+
+    results = {Path(result.output_path).parent.name: result
+               for result in convert_to_targets(str(source), [Target('PNG'), Target('JPG')], tmp_path / "out")}
+    assert results['png'].error is None
+    assert Path(results['png'].output_path).exists()
+    assert results['jpg'].error
@@ -0,0 +1,41 @@
+"""Run with: python -m pytest"""
+import io
+
+import pytest
+from PIL import Image
+
+from passthrough import is_complete
+
+CODECS = ['PNG', 'JPEG', 'WEBP', 'BMP', 'GIF', 'TIFF', 'ICO']
+
+
+def encoded(codec):
+    img = Image.effect_noise((48, 32), 40).convert('RGB')
+    buffer = io.BytesIO()
+    (img.convert('P') if codec == 'GIF' else img).save(buffer, codec)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_whole_files_pass(tmp_path, codec):
+    data = encoded(codec)
+    path = tmp_path / "source"
+    path.write_bytes(data)
+    assert is_complete(None, codec, data)
+    assert is_complete(str(path), codec)
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def test_truncated_files_fail(tmp_path, codec):
+    data = encoded(codec)
+    for length in (len(data) // 3, len(data) * 2 // 3, len(data) - 1):
+        path = tmp_path / f"cut{length}"
+        path.write_bytes(data[:length])
+        assert not is_complete(None, codec, data[:length])
+        assert not is_complete(str(path), codec)
+
+
+def test_empty_file_fails(tmp_path):
+    path = tmp_path / "empty.png"
+    path.write_bytes(b'')
+    assert not is_complete(str(path), 'PNG')
@@ -0,0 +1,37 @@
+"""Run with: python -m pytest"""
+import threading
+
+import pytest
+from PIL import Image
+
+import converter_engine
+from converter_engine import ConvertOptions
+from fanout import Target
+from preflight import preflight
+
+
+def save(path, size):
+    Image.new('RGB', size, (10, 20, 30)).save(path)
+    return str(path)
+
+
+def test_probes_with_a_ceiling_do_not_take_the_pixel_limit_lock(tmp_path):
+    sources = [save(tmp_path / f"{i}.png", (32, 32)) for i in range(8)]
+    report = []
+    # A conversion holding the lock must not stall header reads
+    with converter_engine._pixel_limit_lock:
+        thread = threading.Thread(target=lambda: report.append(
+            preflight(sources, [Target('JPG')], ConvertOptions(max_memory_mb=64))))
+        thread.start()
+        thread.join(timeout=10)
+    assert report and len(report[0].ok) == 8
+
+
+def test_files_over_pillows_limit_follow_the_ceiling(tmp_path, monkeypatch):
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    source = save(tmp_path / "big.png", (100, 100))
+
+    assert preflight([source], [Target('JPG')]).bad
+    assert preflight([source], [Target('JPG')], ConvertOptions(max_memory_mb=64)).ok
+    assert preflight([source], [Target('JPG')], ConvertOptions(max_memory_mb=0.01)).bad
+    assert Image.MAX_IMAGE_PIXELS == 1000
@@ -0,0 +1,190 @@
+"""Rotation benchmark on synthetic clips.
+
+Generates test clips locally with ffmpeg's testsrc video and sine audio
+sources (several resolutions, durations and source codecs), rotates each
+one with every mode, method and encoder preset, and records wall time,
+speed as a multiple of realtime, output size and the CPU used by ffmpeg.
+Results go to JSON; pass --compare to diff against an earlier run.
+
+Example:
+    python benchmark.py -o bench.json
+    python benchmark.py --resolutions 1920x1080 --durations 60 --methods encode segmented --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from ffmpeg_setup import PRESETS, find_ffmpeg, probe_capabilities, video_encoder
+from rotate_engine import DEFAULT_ENCODER, METHODS, EncoderSettings, ffmpeg_error, rotate_with, run_ffmpeg
+from transforms import MODES
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_RESOLUTIONS = ("640x360", "1280x720", "1920x1080")
+DEFAULT_DURATIONS = (10, 40)
+# Source codecs for the generated clips (skipped when this ffmpeg can't encode them)
+SOURCE_CODECS = ("libx264", "libx265", "mpeg4")
+DEFAULT_PRESETS = ("ultrafast", "veryfast", "medium")
+
+
+def make_clip(ffmpeg_path, folder, size, duration, codec):
+    """Encode a testsrc + sine clip; keyframes every 2 s so segmented mode has places to split."""
+    path = os.path.join(folder, f"src_{codec}_{size}_{duration}s.mp4")
+    run_ffmpeg([
+        ffmpeg_path, "-v", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc=size={size}:rate=30:duration={duration}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}",
+        "-c:v", codec, "-g", "60", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-shortest",
+        path
+    ])
+    return path
+
+
+def child_cpu_seconds():
+    """User + system CPU time of all finished child processes, or None where unsupported."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_case(ffmpeg_path, source, duration, mode, method, encoder, repeat):
+    """Rotate source repeat times; report the median wall time and the CPU ffmpeg used."""
+    walls = []
+    cpu = []
+    bytes_out = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, "out.mp4")
+        for _ in range(repeat):
+            cpu_before = child_cpu_seconds()
+            start = time.perf_counter()
+            rotate_with(method, ffmpeg_path, source, mode, output_path, encoder=encoder)
+            walls.append(time.perf_counter() - start)
+            if cpu_before is not None:
+                cpu.append(child_cpu_seconds() - cpu_before)
+            bytes_out = os.path.getsize(output_path)
+
+    wall = statistics.median(walls)
+    cpu_seconds = statistics.median(cpu) if cpu else None
+    return {
+        "wall_s": round(wall, 3),
+        "speed": round(duration / wall, 2) if wall else None,
+        "bytes_out": bytes_out,
+        "cpu_s": round(cpu_seconds, 3) if cpu_seconds is not None else None,
+        # Share of all cores kept busy: 100% means every core for the whole run
+        "cpu_percent": round(cpu_seconds / wall / (os.cpu_count() or 1) * 100, 1)
+        if cpu_seconds is not None and wall else None,
+    }
+
+
+def case_key(case):
+    return (case["resolution"], case["duration"], case["source_codec"], case["mode"], case["method"],
+            case["preset"])
+
+
+def case_label(case):
+    return (f"{case['source_codec']} {case['resolution']} {case['duration']}s "
+            f"{case['mode']} {case['method']} {case['preset']}")
+
+
+def compare(results, baseline_path):
+    """Print the speed change per case against an earlier results file."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {case_key(case): case for case in json.load(f)["cases"]}
+    print(f"\n{'case':<55} {'old x':>8} {'new x':>8} {'change':>8}")
+    for case in results["cases"]:
+        old = baseline.get(case_key(case))
+        if not old or not old.get("speed") or not case.get("speed"):
+            continue
+        change = case["speed"] / old["speed"] - 1
+        print(f"{case_label(case):<55} {old['speed']:>8.2f} {case['speed']:>8.2f} {change:>+8.1%}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark video rotation on synthetic clips.")
+    parser.add_argument("--ffmpeg", default=find_ffmpeg(), help="ffmpeg binary (default: from PATH)")
+    parser.add_argument("--resolutions", nargs="+", default=DEFAULT_RESOLUTIONS,
+                        help="clip sizes, e.g. 1280x720")
+    parser.add_argument("--durations", nargs="+", type=int, default=DEFAULT_DURATIONS,
+                        help="clip lengths in seconds")
+    parser.add_argument("--codecs", nargs="+", default=SOURCE_CODECS, choices=SOURCE_CODECS,
+                        help="source clip codecs")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES), help="rotation modes")
+    parser.add_argument("--methods", nargs="+", default=list(METHODS), choices=METHODS, help="rotation methods")
+    parser.add_argument("--presets", nargs="+", default=DEFAULT_PRESETS, choices=PRESETS,
+                        help="encoder presets for the re-encoding methods")
+    parser.add_argument("--crf", type=int, default=DEFAULT_ENCODER.crf, help="CRF for the re-encoding methods")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case; the median is reported")
+    parser.add_argument("-o", "--output", default="rotate_benchmark.json", help="JSON results file")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.ffmpeg:
+        print("ffmpeg not found on PATH; pass --ffmpeg", file=sys.stderr)
+        return 2
+    capabilities = probe_capabilities(args.ffmpeg)
+    encoder_codec = video_encoder(capabilities)
+    codecs = [codec for codec in args.codecs if codec in capabilities.encoders]
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "ffmpeg": capabilities.version,
+            "encoder": encoder_codec,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "crf": args.crf,
+            "repeat": args.repeat,
+        },
+        "clips": [],
+        "cases": [],
+    }
+
+    with tempfile.TemporaryDirectory() as clip_dir:
+        for codec in codecs:
+            for size in args.resolutions:
+                for duration in args.durations:
+                    source = make_clip(args.ffmpeg, clip_dir, size, duration, codec)
+                    results["clips"].append({"source_codec": codec, "resolution": size, "duration": duration,
+                                             "bytes": os.path.getsize(source)})
+                    for mode in args.modes:
+                        for method in args.methods:
+                            # The display matrix is written without encoding: presets don't apply
+                            presets = ["copy"] if method == "metadata" else args.presets
+                            for preset in presets:
+                                case = {"source_codec": codec, "resolution": size, "duration": duration,
+                                        "mode": mode, "method": method, "preset": preset}
+                                encoder = EncoderSettings(encoder_codec, preset, args.crf)
+                                try:
+                                    case.update(run_case(args.ffmpeg, source, duration, mode, method, encoder,
+                                                         args.repeat))
+                                except Exception as e:
+                                    case["error"] = ffmpeg_error(e)
+                                results["cases"].append(case)
+                                print(f"{case_label(case):<55} {case.get('speed', 'error')!s:>8}x  "
+                                      f"{case.get('wall_s', '')} s  {case.get('cpu_percent', '')}% cpu")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""Find ffmpeg, ask it what it can do, and tune the encoder for this CPU.
+
+Adaptive tuning encodes a few seconds from the middle of the input with
+each candidate preset/CRF and keeps the best-quality setting that still
+meets a target speed (multiple of realtime) and bitrate budget. Results
+are cached per ffmpeg build, video format and target, so a folder of clips
+from the same camera is only measured once.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from functools import lru_cache
+
+from rotate_engine import DEFAULT_ENCODER, EncoderSettings, encode_args, probe_media, run_ffmpeg, video_stream
+from transforms import as_transform, output_duration, video_filter
+
+# Software video encoders, most preferred first; nothing here needs a GPU
+SOFTWARE_ENCODERS = ("libx264", "libx265", "mpeg4")
+
+# x264/x265 presets, best quality (slowest) first
+PRESETS = ("slow", "medium", "fast", "faster", "veryfast", "superfast", "ultrafast")
+
+# CRF values tried against a bitrate budget, best quality first
+CRF_STEPS = (18, 20, 23, 26, 28, 32)
+
+# Seconds of video encoded per trial
+TRIAL_SECONDS = 4
+
+# What an ffmpeg build offers: version string, encoder names and CPU threads
+Capabilities = namedtuple("Capabilities", "version encoders threads")
+
+# One trial encode: the settings, speed as a multiple of realtime, and video bitrate in Mbit/s
+Trial = namedtuple("Trial", "encoder speed mbps")
+
+
+def find_ffmpeg(preferred=None):
+    """preferred if it exists, else ffmpeg on PATH or next to this script; None if there is none."""
+    if preferred and os.path.isfile(preferred):
+        return preferred
+    found = shutil.which("ffmpeg")
+    if found:
+        return found
+    name = "ffmpeg.exe" if os.name == "nt" else "ffmpeg"
+    local = os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    return local if os.path.isfile(local) else None
+
+
+@lru_cache(maxsize=None)
+def probe_capabilities(ffmpeg_path):
+    """Version and encoders of ffmpeg_path. Raises OSError or CalledProcessError if it doesn't run."""
+    banner = run_ffmpeg([ffmpeg_path, "-hide_banner", "-version"]).stdout.split()
+    # "ffmpeg version 6.1.1-essentials_build-www.gyan.dev Copyright ..."
+    version = banner[2] if len(banner) > 2 else "unknown"
+
+    encoders = set()
+    listing = run_ffmpeg([ffmpeg_path, "-hide_banner", "-encoders"]).stdout
+    # Rows after the " ------" rule look like " V....D libx264   libx264 H.264 / AVC ..."
+    _, _, rows = listing.partition("------")
+    for row in rows.splitlines():
+        fields = row.split()
+        if len(fields) >= 2 and fields[0].startswith("V"):
+            encoders.add(fields[1])
+    return Capabilities(version, frozenset(encoders), os.cpu_count() or 1)
+
+
+def describe(capabilities):
+    """One-line summary for the window, e.g. 'ffmpeg 6.1.1 · libx264, libx265 · 16 threads'."""
+    usable = [codec for codec in SOFTWARE_ENCODERS if codec in capabilities.encoders]
+    return (f"ffmpeg {capabilities.version} · {', '.join(usable) or 'no usable encoder'}"
+            f" · {capabilities.threads} threads")
+
+
+def video_encoder(capabilities):
+    """The most preferred software encoder this ffmpeg has."""
+    for codec in SOFTWARE_ENCODERS:
+        if codec in capabilities.encoders:
+            return codec
+    raise ValueError(f"ffmpeg has none of these encoders: {', '.join(SOFTWARE_ENCODERS)}")
+
+
+def default_encoder(ffmpeg_path):
+    """DEFAULT_ENCODER, switched to another codec when this ffmpeg lacks libx264."""
+    return DEFAULT_ENCODER._replace(codec=video_encoder(probe_capabilities(ffmpeg_path)))
+
+
+def video_signature(ffmpeg_path, input_path):
+    """codec, width, height and frame rate of the main video stream, for the tuning cache."""
+    stream = video_stream(probe_media(ffmpeg_path, input_path))
+    if not stream:
+        return (input_path,)  # unknown format: don't share the result
+    return tuple(stream.get(key) for key in ("codec_name", "width", "height", "r_frame_rate"))
+
+
+def trial_encode(ffmpeg_path, input_path, transform, encoder, start, seconds, threads=None):
+    """Encode `seconds` of input_path from `start` with transform and encoder and return a Trial."""
+    with tempfile.TemporaryDirectory(prefix=".rotate_trial_") as tmp:
+        sample = os.path.join(tmp, "trial.mkv")
+        began = time.monotonic()
+        run_ffmpeg([
+            ffmpeg_path, "-v", "error", "-y",
+            "-ss", f"{start:.3f}", "-t", f"{seconds:.3f}", "-i", input_path,
+            "-an", "-vf", video_filter(as_transform(transform)),
+            *encode_args(encoder, threads),
+            sample
+        ])
+        wall = time.monotonic() - began
+        size = os.path.getsize(sample)
+    return Trial(encoder, seconds / wall if wall else float("inf"), size * 8 / seconds / 1e6)
+
+
+_tuned = {}
+_tune_locks = {}
+_tune_locks_guard = threading.Lock()
+
+
+def tune(ffmpeg_path, input_path, transform, target_speed=None, max_mbps=None, threads=None):
+    """Pick the best-quality EncoderSettings that encodes input_path at
+    target_speed times realtime or faster and within max_mbps.
+
+    The preset is found first (binary search over PRESETS at CRF 18), then
+    the lowest CRF in CRF_STEPS that fits the bitrate. When nothing meets a
+    target, the fastest preset or highest CRF is used. Without targets, or
+    for encoders without presets, default_encoder() is returned untried.
+    """
+    codec = video_encoder(probe_capabilities(ffmpeg_path))
+    if codec not in ("libx264", "libx265") or not (target_speed or max_mbps):
+        return default_encoder(ffmpeg_path)
+
+    transform = as_transform(transform)
+    # Trim points don't change the cost per second, only the filter chain does
+    key = (ffmpeg_path, codec, video_filter(transform), target_speed, max_mbps, threads,
+           video_signature(ffmpeg_path, input_path))
+    with _tune_locks_guard:
+        lock = _tune_locks.setdefault(key, threading.Lock())
+    # Jobs that share a key wait for the first one's measurement instead of repeating it
+    with lock:
+        if key not in _tuned:
+            _tuned[key] = _search(ffmpeg_path, input_path, transform, codec, target_speed, max_mbps, threads)
+        return _tuned[key]
+
+
+def _search(ffmpeg_path, input_path, transform, codec, target_speed, max_mbps, threads):
+    duration = output_duration(transform, probe_media(ffmpeg_path, input_path).duration) or TRIAL_SECONDS
+    seconds = min(TRIAL_SECONDS, duration)
+    # Skip the intro: the middle of a clip is more typical than its first frames
+    start = (transform.start or 0) + max(0.0, min(duration / 3, duration - seconds))
+
+    def trial(preset, crf):
+        encoder = EncoderSettings(codec, preset, crf)
+        return trial_encode(ffmpeg_path, input_path, transform, encoder, start, seconds, threads)
+
+    preset = DEFAULT_ENCODER.preset
+    if target_speed:
+        # Speed rises along PRESETS: find the first (slowest) one that is fast enough
+        low, high = 0, len(PRESETS) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if trial(PRESETS[middle], CRF_STEPS[0]).speed >= target_speed:
+                high = middle
+            else:
+                low = middle + 1
+        preset = PRESETS[low]
+
+    crf = CRF_STEPS[0]
+    if max_mbps:
+        # Bitrate falls as CRF rises: find the first CRF within budget
+        low, high = 0, len(CRF_STEPS) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if trial(preset, CRF_STEPS[middle]).mbps <= max_mbps:
+                high = middle
+            else:
+                low = middle + 1
+        crf = CRF_STEPS[low]
+    return EncoderSettings(codec, preset, crf)
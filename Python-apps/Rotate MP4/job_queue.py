@@ -0,0 +1,158 @@
+"""Job queue for the rotator: many files, a few ffmpeg processes at a time."""
+import itertools
+import os
+import threading
+import time
+
+from ffmpeg_setup import default_encoder, tune
+from rotate_engine import Cancelled, ffmpeg_error, needs_work, rotate_with
+from transforms import as_transform
+
+# Job states, in the order a job moves through them
+QUEUED, RUNNING, DONE, SKIPPED, FAILED, CANCELLED = "queued", "running", "done", "skipped", "failed", "cancelled"
+
+_job_ids = itertools.count(1)
+
+
+class Job:
+    """One file to rotate, plus where it got to.
+
+    encoder is a fixed EncoderSettings; tuning is (target_speed, max_mbps)
+    to pick one with ffmpeg_setup.tune() when the job starts instead.
+    """
+
+    def __init__(self, ffmpeg_path, input_path, transform, method="encode", encoder=None, tuning=None):
+        self.id = next(_job_ids)
+        self.ffmpeg_path = ffmpeg_path
+        self.input_path = input_path
+        self.transform = as_transform(transform)
+        self.method = method
+        self.encoder = encoder
+        self.tuning = tuning
+        self.state = QUEUED
+        self.output_path = None
+        self.error = None
+        self.started = None
+        self.finished = None
+        # Latest rotate_engine.Progress while running
+        self.progress = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def name(self):
+        return os.path.basename(self.input_path)
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+
+class JobScheduler:
+    """Run jobs on background threads, at most `concurrency` ffmpeg jobs at once.
+
+    UI-free: every state change is reported by calling on_update(job) from
+    the worker thread, so a GUI should hand it to its own thread (e.g. via a
+    queue.Queue polled with after()). The concurrency can be changed while
+    jobs run; it applies as soon as a slot frees up.
+    """
+
+    def __init__(self, concurrency=2, on_update=None):
+        self.concurrency = max(1, concurrency)
+        self.on_update = on_update or (lambda job: None)
+        self.jobs = []
+        self.running = 0
+        self.lock = threading.Lock()
+
+    def add(self, job):
+        with self.lock:
+            self.jobs.append(job)
+        self.on_update(job)
+        self._fill()
+        return job
+
+    def set_concurrency(self, concurrency):
+        self.concurrency = max(1, concurrency)
+        self._fill()
+
+    def cancel_queued(self):
+        """Drop jobs that have not started yet."""
+        self.cancel([job for job in self.jobs if job.state == QUEUED])
+
+    def cancel(self, jobs=None):
+        """Cancel jobs (default: every unfinished job).
+
+        Queued jobs are dropped at once; running ones stop their ffmpeg
+        processes, remove their partial output and report CANCELLED from the
+        worker thread.
+        """
+        dropped = []
+        with self.lock:
+            for job in self.jobs if jobs is None else jobs:
+                if job.state == QUEUED:
+                    job.state = CANCELLED
+                    dropped.append(job)
+                elif job.state == RUNNING:
+                    job.cancel_event.set()
+        for job in dropped:
+            self.on_update(job)
+
+    def counts(self):
+        """Number of jobs per state."""
+        counts = dict.fromkeys((QUEUED, RUNNING, DONE, SKIPPED, FAILED, CANCELLED), 0)
+        for job in self.jobs:
+            counts[job.state] += 1
+        return counts
+
+    def _fill(self):
+        # Start queued jobs, oldest first, while slots are free
+        started = []
+        with self.lock:
+            for job in self.jobs:
+                if self.running >= self.concurrency:
+                    break
+                if job.state == QUEUED:
+                    job.state = RUNNING
+                    job.started = time.monotonic()
+                    self.running += 1
+                    started.append(job)
+        for job in started:
+            threading.Thread(target=self._run, args=(job,), daemon=True).start()
+
+    def _run(self, job):
+        self.on_update(job)
+        # Running jobs share the cores: encoder threads or parallel segments
+        workers = max(1, (os.cpu_count() or 1) // self.concurrency)
+
+        def progress(report):
+            job.progress = report
+            self.on_update(job)
+
+        try:
+            # Auto-upright on a file without display rotation: nothing to do
+            if not needs_work(job.ffmpeg_path, job.input_path, job.transform):
+                job.error = "already upright"
+                job.state = SKIPPED
+                return
+            if job.method != "metadata":
+                if job.tuning:
+                    job.encoder = tune(job.ffmpeg_path, job.input_path, job.transform, *job.tuning, threads=workers)
+                elif job.encoder is None:
+                    job.encoder = default_encoder(job.ffmpeg_path)
+                self.on_update(job)
+            job.output_path = rotate_with(job.method, job.ffmpeg_path, job.input_path, job.transform,
+                                          workers=workers, progress=progress, cancel_event=job.cancel_event,
+                                          encoder=job.encoder)
+            job.state = DONE
+        except Cancelled:
+            job.state = CANCELLED
+        except Exception as e:
+            job.error = ffmpeg_error(e)
+            job.state = FAILED
+        finally:
+            job.finished = time.monotonic()
+            with self.lock:
+                self.running -= 1
+            self.on_update(job)
+            self._fill()
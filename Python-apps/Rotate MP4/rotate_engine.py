@@ -0,0 +1,523 @@
+"""UI-free ffmpeg helpers for the video rotator."""
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+
+from transforms import (AUTO, Transform, as_transform, input_args, is_trimmed, output_duration,
+                        source_bases, suffix, video_filter)
+
+# How a rotation is done: one-pass re-encode, parallel segments, or display matrix only
+METHODS = ("encode", "segmented", "metadata")
+
+# Files picked up when a folder is added
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".mkv", ".avi", ".flv", ".wmv")
+
+# Containers whose display matrix players honour
+METADATA_CONTAINERS = (".mp4", ".mov", ".m4v")
+
+# Video encoder for a re-encode: ffmpeg encoder name, x264-style preset and CRF
+EncoderSettings = namedtuple("EncoderSettings", "codec preset crf")
+DEFAULT_ENCODER = EncoderSettings("libx264", "veryfast", 18)
+
+# Stream types each output container takes ("mov_text": text subtitles are
+# converted to it); other containers get the video and audio only
+CONTAINER_STREAMS = {
+    ".mkv": ("video", "audio", "subtitle", "attachment"),
+    ".mp4": ("video", "audio", "subtitle", "mov_text"),
+    ".m4v": ("video", "audio", "subtitle", "mov_text"),
+    # QuickTime keeps timecode tracks as data streams
+    ".mov": ("video", "audio", "subtitle", "mov_text", "data"),
+}
+
+TEXT_SUBTITLES = ("mov_text", "subrip", "srt", "ass", "ssa", "webvtt", "text")
+
+# Segments shorter than this cost more in process start-up than they win
+MIN_SEGMENT_SECONDS = 10
+
+# A live ffmpeg report: fraction done (None when the duration is unknown),
+# frames and fps encoded, speed as a multiple of realtime, seconds of media
+# written and estimated seconds left
+Progress = namedtuple("Progress", "fraction frame fps speed out_time eta")
+
+
+class Cancelled(Exception):
+    """The job was cancelled; its ffmpeg processes were stopped and partial output removed."""
+
+
+def output_path_for(input_path, transform):
+    """Output next to the input, e.g. clip.mp4 -> clip_90cw.mp4."""
+    base, ext = os.path.splitext(input_path)
+    return base + suffix(as_transform(transform)) + ext
+
+
+def find_videos(folder):
+    """Video files under folder, skipping leftover partial files and outputs of
+    earlier rotations (a suffixed name whose source is in the same folder)."""
+    for dirpath, dirnames, filenames in os.walk(folder):
+        dirnames[:] = sorted(name for name in dirnames if not name.startswith(".rotate_"))
+        names = set(filenames)
+        for name in sorted(filenames):
+            base, ext = os.path.splitext(name)
+            if ext.lower() not in VIDEO_EXTENSIONS or is_partial_name(name):
+                continue
+            if any(source + ext in names for source in source_bases(base)):
+                continue
+            yield os.path.join(dirpath, name)
+
+
+def is_partial_name(name):
+    """True for the hidden temporary file partial_output() writes to."""
+    return name.startswith(".") and os.path.splitext(name)[0].endswith(".partial")
+
+
+def run_ffmpeg(cmd, duration=None, progress=None, cancel_event=None):
+    """Run ffmpeg or ffprobe without a console prompt; CalledProcessError carries its stderr.
+
+    With progress or cancel_event, ffmpeg runs asynchronously and reports
+    through -progress pipe:1: progress(Progress) is called about twice a
+    second, with fraction and ETA worked out against duration. Setting
+    cancel_event stops ffmpeg and raises Cancelled.
+    """
+    if progress is None and cancel_event is None:
+        return subprocess.run(cmd, check=True, capture_output=True, text=True, stdin=subprocess.DEVNULL)
+
+    cmd = [cmd[0], "-progress", "pipe:1", "-nostats", *cmd[1:]]
+    proc = subprocess.Popen(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                            stderr=subprocess.PIPE, text=True)
+    # Drain stderr on the side so a chatty ffmpeg can't fill the pipe and stall
+    stderr_tail = deque(maxlen=50)
+    reader = threading.Thread(target=stderr_tail.extend, args=(proc.stderr,), daemon=True)
+    reader.start()
+
+    start = time.monotonic()
+    fields = {}
+    try:
+        for line in proc.stdout:
+            if cancel_event is not None and cancel_event.is_set():
+                raise Cancelled()
+            key, _, value = line.strip().partition("=")
+            fields[key] = value
+            # Each report ends with progress=continue (or progress=end)
+            if key == "progress" and progress is not None:
+                progress(parse_progress(fields, duration, time.monotonic() - start))
+        proc.wait()
+        if cancel_event is not None and cancel_event.is_set():
+            raise Cancelled()
+    except BaseException:
+        stop_process(proc)
+        raise
+    reader.join()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, None, "".join(stderr_tail))
+    return proc
+
+
+def stop_process(proc):
+    """Terminate proc, killing it if it doesn't exit within a few seconds."""
+    if proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def parse_progress(fields, duration, elapsed):
+    """Turn the key=value fields of one -progress report into a Progress."""
+    def number(key):
+        try:
+            return float(fields.get(key, "").rstrip("x"))
+        except ValueError:
+            return None  # N/A before the first frame
+
+    out_time = (number("out_time_us") or 0) / 1e6
+    speed = number("speed")
+    if not speed and out_time and elapsed:
+        speed = out_time / elapsed
+    fraction = eta = None
+    if duration:
+        if fields.get("progress") == "end":
+            fraction, eta = 1.0, 0.0
+        else:
+            fraction = min(1.0, out_time / duration)
+            eta = max(0.0, (duration - out_time) / speed) if speed else None
+    return Progress(fraction, int(number("frame") or 0), number("fps") or 0.0, speed, out_time, eta)
+
+
+@contextmanager
+def partial_output(output_path):
+    """Yield a temp path next to output_path for ffmpeg to write, and rename it
+    into place on success. On failure or cancel the partial file is removed
+    and an existing output_path is left alone."""
+    folder, name = os.path.split(os.path.abspath(output_path))
+    stem, ext = os.path.splitext(name)
+    # Keep the extension: ffmpeg picks the muxer from it
+    tmp_path = os.path.join(folder, f".{stem}.partial{ext}")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def ffmpeg_error(error):
+    """Short message for a failed ffmpeg run: the last line it printed."""
+    if isinstance(error, Cancelled):
+        return "cancelled"
+    lines = (getattr(error, "stderr", None) or "").strip().splitlines()
+    return lines[-1] if lines else str(error)
+
+
+def ffprobe_for(ffmpeg_path):
+    """ffprobe sitting next to ffmpeg (ffprobe.exe on Windows)."""
+    folder, name = os.path.split(ffmpeg_path)
+    return os.path.join(folder, name.lower().replace("ffmpeg", "ffprobe", 1))
+
+
+# What ffprobe reports about a file: container duration in seconds (None if
+# unknown), every stream as ffprobe's dict, and the index of the main video
+# stream (the first one that isn't cover art; None for audio-only files)
+MediaInfo = namedtuple("MediaInfo", "duration streams video_index")
+
+
+def probe_media(ffmpeg_path, input_path):
+    """Probe input_path once with ffprobe; repeated calls for an unchanged file hit a cache."""
+    try:
+        stat = os.stat(input_path)
+    except OSError:
+        return MediaInfo(None, (), None)
+    return _probe_media(ffmpeg_path, os.path.abspath(input_path), stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=256)
+def _probe_media(ffmpeg_path, input_path, mtime_ns, size):
+    # mtime and size are only part of the cache key, so an edited file is probed again
+    cmd = [ffprobe_for(ffmpeg_path), "-v", "error", "-show_format", "-show_streams", "-of", "json", input_path]
+    try:
+        report = json.loads(run_ffmpeg(cmd).stdout)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return MediaInfo(None, (), None)
+
+    try:
+        duration = float(report.get("format", {}).get("duration"))
+    except (TypeError, ValueError):
+        duration = None
+    streams = tuple(report.get("streams", ()))
+    video_index = next((stream["index"] for stream in streams
+                        if stream.get("codec_type") == "video"
+                        and not stream.get("disposition", {}).get("attached_pic")), None)
+    return MediaInfo(duration, streams, video_index)
+
+
+def video_stream(info):
+    """ffprobe's dict for the main video stream ({} if there is none)."""
+    return next((stream for stream in info.streams if stream["index"] == info.video_index), {})
+
+
+def probe_duration(ffmpeg_path, input_path):
+    """Container duration in seconds, or None if ffprobe can't tell."""
+    return probe_media(ffmpeg_path, input_path).duration
+
+
+def probe_rotation(ffmpeg_path, input_path):
+    """Current counter-clockwise display rotation of the main video stream in degrees (0 if none)."""
+    stream = video_stream(probe_media(ffmpeg_path, input_path))
+    for side_data in stream.get("side_data_list", []):
+        if "rotation" in side_data:
+            return int(round(float(side_data["rotation"])))
+    # Older muxers: a clockwise 'rotate' tag
+    rotate_tag = stream.get("tags", {}).get("rotate")
+    return -int(rotate_tag) if rotate_tag else 0
+
+
+def stream_map(info, output_path, source=0, video=None):
+    """-map and -c options that carry every stream of input `source` into output_path.
+
+    The main video is mapped first, from `video` (an ffmpeg stream
+    specifier, by default the main video of `source`), so the caller's
+    options for output stream v:0 apply to it alone. Every other stream
+    (extra audio tracks, subtitles, cover art, attachments, data) is
+    stream-copied along with the chapters and metadata, except streams the
+    output container can't hold: text subtitles become mov_text in MP4/MOV,
+    the rest are left out.
+    """
+    if not info.streams:
+        # ffprobe failed: the old defaults, first video and any audio
+        return ["-map", video or f"{source}:v:0", "-map", f"{source}:a?", "-c", "copy"]
+
+    kinds = CONTAINER_STREAMS.get(os.path.splitext(output_path)[1].lower(), ("video", "audio"))
+    args = []
+    if info.video_index is not None:
+        args += ["-map", video or f"{source}:{info.video_index}"]
+    args += ["-map_metadata", str(source), "-map_chapters", str(source), "-c", "copy"]
+    subtitles = 0
+    for stream in info.streams:
+        kind = stream.get("codec_type")
+        if stream["index"] == info.video_index or kind not in kinds:
+            continue
+        if kind == "subtitle" and "mov_text" in kinds:
+            if stream.get("codec_name") not in TEXT_SUBTITLES:
+                continue  # bitmap subtitles have no MP4 equivalent
+            if stream.get("codec_name") != "mov_text":
+                args += [f"-c:s:{subtitles}", "mov_text"]
+        subtitles += kind == "subtitle"
+        args += ["-map", f"{source}:{stream['index']}"]
+    return args
+
+
+def upright_turn(ffmpeg_path, input_path):
+    """Clockwise degrees that turn the main video upright (0 when it has no display
+    rotation), or None when ffprobe found no video stream to read it from."""
+    if probe_media(ffmpeg_path, input_path).video_index is None:
+        return None
+    return -probe_rotation(ffmpeg_path, input_path) % 360
+
+
+def needs_work(ffmpeg_path, input_path, transform):
+    """False when transform is a bare AUTO and input_path is already upright, so the file can be skipped.
+
+    Raises ValueError when ffprobe can't read input_path: an unknown rotation is not "upright".
+    """
+    transform = as_transform(transform)
+    if transform != Transform(rotate=AUTO):
+        return True
+    turn = upright_turn(ffmpeg_path, input_path)
+    if turn is None:
+        raise ValueError("ffprobe could not read this file")
+    return turn != 0
+
+
+def normalize_degrees(degrees):
+    """Fold an angle into (-180, 180]."""
+    degrees %= 360
+    return degrees - 360 if degrees > 180 else degrees
+
+
+def encode_args(encoder=None, threads=None):
+    """ffmpeg output options encoding the first video stream; threads=None lets ffmpeg use every core."""
+    codec, preset, crf = encoder or DEFAULT_ENCODER
+    if codec in ("libx264", "libx265"):
+        args = ["-c:v:0", codec, "-crf", str(crf), "-preset", preset]
+    else:
+        # mpeg4 and friends: no presets, fixed quantizer instead of CRF
+        args = ["-c:v:0", codec, "-q:v:0", str(max(2, min(31, crf // 6)))]
+    if threads:
+        args += ["-threads", str(threads)]
+    return args
+
+
+def rotate_command(ffmpeg_path, input_path, output_path, transform, encoder=None, threads=None, info=None):
+    """One-pass ffmpeg command: transform and re-encode the main video, copy every other stream.
+
+    transform is a Transform or a mode name; a trim seeks on the input side.
+    info is the input's MediaInfo (probed if None).
+    """
+    transform = as_transform(transform)
+    info = info or probe_media(ffmpeg_path, input_path)
+    return [
+        ffmpeg_path, "-v", "error", "-y",
+        *input_args(transform),
+        "-i", input_path,
+        *stream_map(info, output_path),
+        "-filter:v:0", video_filter(transform),
+        *encode_args(encoder, threads),
+        output_path
+    ]
+
+
+def rotate(ffmpeg_path, input_path, transform, output_path=None, progress=None, cancel_event=None,
+           encoder=None, threads=None):
+    """Transform input_path in a single ffmpeg process. Raises CalledProcessError on failure.
+
+    progress and cancel_event are passed to run_ffmpeg; encoder is an
+    EncoderSettings (DEFAULT_ENCODER if None).
+    """
+    transform = as_transform(transform)
+    output_path = output_path or output_path_for(input_path, transform)
+    info = probe_media(ffmpeg_path, input_path)
+    with partial_output(output_path) as tmp_path:
+        cmd = rotate_command(ffmpeg_path, input_path, tmp_path, transform, encoder, threads, info)
+        run_ffmpeg(cmd, output_duration(transform, info.duration), progress, cancel_event)
+    return output_path
+
+
+def concat_list_line(path):
+    # The concat demuxer reads single-quoted paths; a quote inside is written as '\''
+    return "file '" + path.replace("'", "'\\''") + "'\n"
+
+
+def rotate_segmented(ffmpeg_path, input_path, transform, output_path=None, workers=None,
+                     progress=None, cancel_event=None, encoder=None):
+    """Rotate input_path in parallel pieces.
+
+    The video stream is split at keyframes with a stream copy into about one
+    segment per worker, the segments are rotated by parallel ffmpeg
+    processes, and the results are joined with the concat demuxer (again a
+    stream copy) while every other stream is copied from the source.
+    Short clips and trims (segments only split at keyframes) fall back to
+    rotate(). Raises CalledProcessError on failure.
+
+    progress gets the combined progress of all segments; cancel_event stops
+    every running segment.
+    """
+    transform = as_transform(transform)
+    output_path = output_path or output_path_for(input_path, transform)
+    workers = max(1, workers or os.cpu_count() or 1)
+
+    info = probe_media(ffmpeg_path, input_path)
+    duration = info.duration
+    if (duration is None or info.video_index is None or workers == 1 or duration < 2 * MIN_SEGMENT_SECONDS
+            or is_trimmed(transform)):
+        return rotate(ffmpeg_path, input_path, transform, output_path, progress, cancel_event, encoder, workers)
+    segments = max(2, min(workers, int(duration // MIN_SEGMENT_SECONDS)))
+    # Split this job's share of the cores between its parallel encoders instead of oversubscribing
+    threads = max(1, workers // min(workers, segments))
+
+    # Temp files go next to the output so the final mux stays on one disk
+    with tempfile.TemporaryDirectory(prefix=".rotate_", dir=os.path.dirname(os.path.abspath(output_path))) as tmp:
+        # 1. Split at keyframes without re-encoding, in the source's own container so
+        #    each part keeps the display matrix that ffmpeg's autorotation reads
+        part_ext = os.path.splitext(input_path)[1].lower()
+        run_ffmpeg([
+            ffmpeg_path, "-v", "error",
+            "-i", input_path,
+            "-map", f"0:{info.video_index}", "-c", "copy",
+            "-f", "segment", "-segment_time", f"{duration / segments:.3f}",
+            "-reset_timestamps", "1",
+            os.path.join(tmp, "part%04d" + part_ext)
+        ], cancel_event=cancel_event)
+        parts = sorted(name for name in os.listdir(tmp) if name.startswith("part"))
+
+        # 2. Rotate every segment, several ffmpeg processes at a time
+        start = time.monotonic()
+        done = {}
+        frames = {}
+        lock = threading.Lock()
+
+        def part_progress(name, report):
+            # Media seconds finished across all segments give the combined progress
+            with lock:
+                done[name] = report.out_time
+                frames[name] = report.frame
+                out_time = sum(done.values())
+                frame = sum(frames.values())
+            elapsed = time.monotonic() - start
+            speed = out_time / elapsed if elapsed else None
+            eta = (duration - out_time) / speed if speed else None
+            progress(Progress(min(1.0, out_time / duration), frame, frame / elapsed if elapsed else 0.0,
+                              speed, out_time, eta))
+
+        def rotate_part(name):
+            # Encoded parts carry no matrix any more; Matroska takes every encoder's output
+            rotated = os.path.join(tmp, "rotated_" + os.path.splitext(name)[0] + ".mkv")
+            report = (lambda p: part_progress(name, p)) if progress else None
+            run_ffmpeg([
+                ffmpeg_path, "-v", "error",
+                "-i", os.path.join(tmp, name),
+                "-vf", video_filter(transform),
+                *encode_args(encoder, threads),
+                rotated
+            ], progress=report, cancel_event=cancel_event)
+            return rotated
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            rotated = list(pool.map(rotate_part, parts))
+
+        # 3. Join the rotated segments losslessly and copy the other streams from the source
+        list_path = os.path.join(tmp, "parts.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            f.writelines(concat_list_line(path) for path in rotated)
+        with partial_output(output_path) as tmp_path:
+            run_ffmpeg([
+                ffmpeg_path, "-v", "error", "-y",
+                "-f", "concat", "-safe", "0", "-i", list_path,
+                "-i", input_path,
+                *stream_map(info, output_path, source=1, video="0:v:0"),
+                tmp_path
+            ], cancel_event=cancel_event)
+    return output_path
+
+
+def rotate_metadata(ffmpeg_path, input_path, transform, output_path=None, progress=None, cancel_event=None):
+    """Rotate by rewriting the container's display matrix only (-c copy).
+
+    No frame is decoded, so this takes about as long as copying the file and
+    loses nothing; players that ignore the matrix still need rotate().
+    The turn is added to any rotation the file already carries.
+    Raises ValueError for containers without a display matrix, transforms
+    that scale or trim, or files ffprobe can't read (their current rotation
+    is unknown), and CalledProcessError on failure.
+    """
+    transform = as_transform(transform)
+    if os.path.splitext(input_path)[1].lower() not in METADATA_CONTAINERS:
+        raise ValueError("Metadata rotation needs an MP4 or MOV file; use a re-encode instead.")
+    if transform.scale or is_trimmed(transform):
+        raise ValueError("Scaling and trimming need a re-encode, not a metadata rotation.")
+    if transform.rotate == AUTO:
+        raise ValueError("Turning upright means rewriting the frames; use a re-encode.")
+    info = probe_media(ffmpeg_path, input_path)
+    if info.video_index is None:
+        # The new matrix replaces the old one: without it the result would be a guess
+        raise ValueError("ffprobe could not read this file, so its current rotation is unknown; "
+                         "use a re-encode instead.")
+    output_path = output_path or output_path_for(input_path, transform)
+    # The matrix turns counter-clockwise
+    rotation = normalize_degrees(probe_rotation(ffmpeg_path, input_path) - transform.rotate)
+    flips = {"h": "-display_hflip", "v": "-display_vflip"}
+    duration = info.duration
+    video = info.video_index
+
+    with partial_output(output_path) as tmp_path:
+        # -display_rotation/-display_hflip/-display_vflip (ffmpeg 6.1+) set the matrix on the input stream
+        cmd = [
+            ffmpeg_path, "-v", "error", "-y",
+            # Input stream options: address the main video by index, cover art may come first
+            f"-display_rotation:{video}", str(rotation),
+            *([f"{flips[transform.flip]}:{video}"] if transform.flip else []),
+            "-i", input_path,
+            *stream_map(info, output_path),
+            tmp_path
+        ]
+        try:
+            run_ffmpeg(cmd, duration, progress, cancel_event)
+        except subprocess.CalledProcessError as e:
+            if "display_rotation" not in (e.stderr or "") or transform.flip:
+                raise
+            # Older ffmpeg: fall back to the clockwise rotate tag, which its mov muxer turns into a matrix
+            run_ffmpeg([
+                ffmpeg_path, "-v", "error", "-y",
+                "-i", input_path,
+                *stream_map(info, output_path),
+                "-metadata:s:v:0", f"rotate={-rotation % 360}",
+                tmp_path
+            ], duration, progress, cancel_event)
+    return output_path
+
+
+def rotate_with(method, ffmpeg_path, input_path, transform, output_path=None, workers=None,
+                progress=None, cancel_event=None, encoder=None):
+    """Transform input_path with one of METHODS and return the output path.
+
+    transform is a transforms.Transform or a mode name from transforms.MODES.
+    workers is the number of cores this job may use: parallel segments for
+    "segmented", encoder threads for "encode" (None: all of them).
+    """
+    if method == "metadata":
+        return rotate_metadata(ffmpeg_path, input_path, transform, output_path, progress, cancel_event)
+    if method == "segmented":
+        return rotate_segmented(ffmpeg_path, input_path, transform, output_path, workers, progress,
+                                cancel_event, encoder)
+    if method == "encode":
+        return rotate(ffmpeg_path, input_path, transform, output_path, progress, cancel_event, encoder, workers)
+    raise ValueError(f"Unknown method '{method}': choose from {', '.join(METHODS)}")
@@ -1,86 +1,336 @@
 import os
+import queue
 import subprocess
 import tkinter as tk
-from tkinter import filedialog, messagebox
-
-# 🔧 Default FFmpeg location
-DEFAULT_FFMPEG = r"D:\Movies\YTDL\EXE\ffmpeg.exe"
-
-def process_video(mode):
-    ffmpeg_path = ffmpeg_entry.get().strip()
-
-    if not os.path.isfile(ffmpeg_path):
-        messagebox.showerror("FFmpeg Error", f"ffmpeg.exe not found at:\n{ffmpeg_path}")
-        return
-
-    # Ask user to pick a video
-    input_path = filedialog.askopenfilename(
-        title="Select a video file",
-        filetypes=[("Video files", "*.mp4;*.mov;*.mkv;*.avi;*.flv;*.wmv")]
-    )
-
-    if not input_path:
-        return  # user cancelled
-
-    # Decide filter and suffix based on mode
-    if mode == "90":
-        vf_filter = "transpose=1"
-        suffix = "_90cw"
-    elif mode == "180":
-        vf_filter = "transpose=2,transpose=2"
-        suffix = "_180"
-    elif mode == "270":
-        vf_filter = "transpose=2"
-        suffix = "_270"
-    elif mode == "flip":
-        vf_filter = "hflip"
-        suffix = "_flip"
-    else:
-        messagebox.showerror("Error", "Unknown mode.")
-        return
-
-    base, ext = os.path.splitext(input_path)
-    output_path = base + suffix + ext
-
-    # FFmpeg command
-    cmd = [
-        ffmpeg_path,
-        "-i", input_path,
-        "-vf", vf_filter,
-        "-c:v", "libx264",
-        "-crf", "18",
-        "-preset", "veryfast",
-        "-c:a", "copy",
-        output_path
-    ]
-
-    try:
-        subprocess.run(cmd, check=True)
-        messagebox.showinfo("Success", f"Done!\nSaved as:\n{output_path}")
-    except subprocess.CalledProcessError:
-        messagebox.showerror("Error", "FFmpeg failed while processing the video.")
-    except Exception as e:
-        messagebox.showerror("Error", f"Unexpected error:\n{e}")
-
-# ---------- GUI ----------
-root = tk.Tk()
-root.title("FFmpeg Video Rotator")
-root.geometry("460x300")
-
-# FFmpeg path label
-tk.Label(root, text="FFmpeg Location:", pady=5).pack()
-
-# Editable FFmpeg path field
-ffmpeg_entry = tk.Entry(root, width=60)
-ffmpeg_entry.insert(0, DEFAULT_FFMPEG)
-ffmpeg_entry.pack(pady=5)
-
-# Buttons
-tk.Label(root, text="Choose rotation:", pady=10).pack()
-
-tk.Button(root, text="Rotate 90° clockwise", width=35, command=lambda: process_video("90")).pack(pady=5)
-tk.Button(root, text="Rotate 180°", width=35, command=lambda: process_video("180")).pack(pady=5)
-tk.Button(root, text="Rotate 270° (90° CCW)", width=35, command=lambda: process_video("270")).pack(pady=5)
-tk.Button(root, text="Flip horizontally (mirror)", width=35, command=lambda: process_video("flip")).pack(pady=5)
-
-root.mainloop()
+from tkinter import filedialog, messagebox, ttk
+
+from ffmpeg_setup import describe, find_ffmpeg, probe_capabilities
+from job_queue import Job, JobScheduler
+from rotate_engine import DEFAULT_ENCODER, find_videos
+from transforms import AUTO, Transform, describe as describe_transform, parse_time, validate
+
+# Rotation and flip choices as shown in the window
+ROTATION_LABELS = [
+    ("0", "No rotation"),
+    ("90", "Rotate 90° clockwise"),
+    ("180", "Rotate 180°"),
+    ("270", "Rotate 270° (90° CCW)"),
+    (AUTO, "Auto upright (from phone metadata)"),
+]
+
+FLIP_LABELS = [
+    ("", "No flip"),
+    ("h", "Flip horizontally (mirror)"),
+    ("v", "Flip vertically"),
+]
+
+# Downscale targets: short side in pixels ("" keeps the size)
+SCALE_CHOICES = ("", "2160", "1440", "1080", "720", "480", "360")
+
+METHOD_LABELS = [
+    ("encode", "Re-encode (works in every player)"),
+    ("segmented", "Re-encode in segments on all cores"),
+    ("metadata", "Metadata only: instant, lossless (MP4/MOV)"),
+]
+
+
+class RotatorApp:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("FFmpeg Video Rotator")
+        self.root.geometry("1040x680")
+
+        # Worker threads post jobs here; the Tk thread applies them in poll_updates
+        self.updates = queue.Queue()
+        self.scheduler = JobScheduler(concurrency=2, on_update=self.updates.put)
+
+        self.setup_ui()
+        self.root.after(100, self.poll_updates)
+
+    def setup_ui(self):
+        # FFmpeg path label
+        tk.Label(self.root, text="FFmpeg Location:", pady=5).pack()
+
+        # Editable FFmpeg path field, pre-filled from PATH
+        ffmpeg_row = tk.Frame(self.root)
+        ffmpeg_row.pack(pady=5)
+        self.ffmpeg_entry = tk.Entry(ffmpeg_row, width=60)
+        self.ffmpeg_entry.insert(0, find_ffmpeg() or "")
+        self.ffmpeg_entry.pack(side=tk.LEFT)
+        tk.Button(ffmpeg_row, text="Browse...", command=self.browse_ffmpeg).pack(side=tk.LEFT, padx=5)
+
+        # What the chosen ffmpeg can do
+        self.capabilities_label = tk.Label(self.root, text="", fg="gray")
+        self.capabilities_label.pack()
+        self.show_capabilities()
+
+        choices = tk.Frame(self.root)
+        choices.pack(pady=5)
+
+        # Rotation applied to the files added next
+        rotation_frame = tk.LabelFrame(choices, text="Choose rotation:", padx=10, pady=5)
+        rotation_frame.pack(side=tk.LEFT, padx=5, fill=tk.Y)
+        self.rotate_var = tk.StringVar(value="90")
+        for value, text in ROTATION_LABELS:
+            tk.Radiobutton(rotation_frame, text=text, variable=self.rotate_var, value=value).pack(anchor="w")
+        ttk.Separator(rotation_frame).pack(fill=tk.X, pady=3)
+        self.flip_var = tk.StringVar(value="")
+        for value, text in FLIP_LABELS:
+            tk.Radiobutton(rotation_frame, text=text, variable=self.flip_var, value=value).pack(anchor="w")
+
+        # Done in the same pass as the rotation
+        resize_frame = tk.LabelFrame(choices, text="Resize & trim:", padx=10, pady=5)
+        resize_frame.pack(side=tk.LEFT, padx=5, fill=tk.Y)
+        tk.Label(resize_frame, text="Downscale to (short side):").grid(row=0, column=0, columnspan=2, sticky="w")
+        self.scale_var = tk.StringVar(value="")
+        ttk.Combobox(resize_frame, textvariable=self.scale_var, values=SCALE_CHOICES,
+                     width=8).grid(row=1, column=0, columnspan=2, sticky="w")
+        tk.Label(resize_frame, text="Trim from:").grid(row=2, column=0, sticky="w", pady=(8, 0))
+        self.start_entry = tk.Entry(resize_frame, width=9)
+        self.start_entry.grid(row=2, column=1, pady=(8, 0))
+        tk.Label(resize_frame, text="to:").grid(row=3, column=0, sticky="w")
+        self.end_entry = tk.Entry(resize_frame, width=9)
+        self.end_entry.grid(row=3, column=1)
+        tk.Label(resize_frame, text="(e.g. 1:30; empty = whole clip)", fg="gray").grid(row=4, column=0,
+                                                                                     columnspan=2, sticky="w")
+
+        # How to rotate: full re-encode, parallel segments for long recordings, or metadata only
+        method_frame = tk.LabelFrame(choices, text="Method:", padx=10, pady=5)
+        method_frame.pack(side=tk.LEFT, padx=5, fill=tk.Y)
+        self.method_var = tk.StringVar(value="encode")
+        for value, text in METHOD_LABELS:
+            tk.Radiobutton(method_frame, text=text, variable=self.method_var, value=value).pack(anchor="w")
+
+        # Encoder settings: the fixed default, or tuned on a sample of each file
+        encoder_frame = tk.LabelFrame(choices, text="Encoder:", padx=10, pady=5)
+        encoder_frame.pack(side=tk.LEFT, padx=5, fill=tk.Y)
+        self.adaptive_var = tk.BooleanVar(value=False)
+        tk.Radiobutton(encoder_frame, text=f"Fixed ({DEFAULT_ENCODER.preset}, CRF {DEFAULT_ENCODER.crf})",
+                       variable=self.adaptive_var, value=False).pack(anchor="w")
+        tk.Radiobutton(encoder_frame, text="Adaptive (trial encode)",
+                       variable=self.adaptive_var, value=True).pack(anchor="w")
+        targets = tk.Frame(encoder_frame)
+        targets.pack(anchor="w")
+        tk.Label(targets, text="Min speed (x realtime):").grid(row=0, column=0, sticky="w")
+        self.speed_entry = tk.Entry(targets, width=6)
+        self.speed_entry.insert(0, "1.0")
+        self.speed_entry.grid(row=0, column=1)
+        tk.Label(targets, text="Max Mbit/s:").grid(row=1, column=0, sticky="w")
+        self.mbps_entry = tk.Entry(targets, width=6)
+        self.mbps_entry.grid(row=1, column=1)
+
+        # Queue controls
+        controls = tk.Frame(self.root)
+        controls.pack(pady=5)
+        tk.Button(controls, text="Add files...", width=14, command=self.add_files).pack(side=tk.LEFT, padx=5)
+        tk.Button(controls, text="Add folder...", width=14, command=self.add_folder).pack(side=tk.LEFT, padx=5)
+        tk.Button(controls, text="Clear queue", width=14,
+                  command=self.scheduler.cancel_queued).pack(side=tk.LEFT, padx=5)
+        tk.Button(controls, text="Cancel selected", width=14,
+                  command=self.cancel_selected).pack(side=tk.LEFT, padx=5)
+        tk.Button(controls, text="Cancel all", width=14,
+                  command=self.scheduler.cancel).pack(side=tk.LEFT, padx=5)
+
+        tk.Label(controls, text="Parallel jobs:").pack(side=tk.LEFT, padx=(15, 5))
+        self.concurrency_var = tk.IntVar(value=self.scheduler.concurrency)
+        tk.Spinbox(controls, from_=1, to=max(16, os.cpu_count() or 1), width=4,
+                   textvariable=self.concurrency_var, command=self.update_concurrency).pack(side=tk.LEFT)
+
+        # One row per job
+        columns = ("transform", "method", "state", "progress")
+        self.job_list = ttk.Treeview(self.root, columns=columns, height=12)
+        self.job_list.heading("#0", text="File")
+        self.job_list.column("#0", width=260)
+        for column in columns:
+            self.job_list.heading(column, text=column.capitalize())
+            self.job_list.column(column, width=80, anchor="center")
+        self.job_list.column("method", width=150)
+        self.job_list.column("transform", width=190)
+        self.job_list.column("progress", width=170)
+        self.job_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+
+        # Overall progress over every job added so far
+        self.progress_bar = ttk.Progressbar(self.root, maximum=1.0)
+        self.progress_bar.pack(fill=tk.X, padx=10)
+
+        self.status_label = tk.Label(self.root, text="Add files to start.", pady=5)
+        self.status_label.pack()
+
+    def browse_ffmpeg(self):
+        ffmpeg_path = filedialog.askopenfilename(title="Locate ffmpeg")
+        if ffmpeg_path:
+            self.ffmpeg_entry.delete(0, tk.END)
+            self.ffmpeg_entry.insert(0, ffmpeg_path)
+            self.show_capabilities()
+
+    def show_capabilities(self):
+        ffmpeg_path = self.ffmpeg_entry.get().strip()
+        try:
+            text = describe(probe_capabilities(ffmpeg_path)) if ffmpeg_path else "ffmpeg not found on PATH"
+        except (OSError, subprocess.CalledProcessError):
+            text = "ffmpeg doesn't run"
+        self.capabilities_label.config(text=text)
+
+    def ffmpeg_path(self):
+        ffmpeg_path = self.ffmpeg_entry.get().strip()
+        if not os.path.isfile(ffmpeg_path):
+            messagebox.showerror("FFmpeg Error", f"ffmpeg not found at:\n{ffmpeg_path}")
+            return None
+        try:
+            probe_capabilities(ffmpeg_path)
+        except (OSError, subprocess.CalledProcessError):
+            messagebox.showerror("FFmpeg Error", f"This doesn't run as ffmpeg:\n{ffmpeg_path}")
+            return None
+        self.show_capabilities()
+        return ffmpeg_path
+
+    def transform(self):
+        """The Transform chosen in the window; raises ValueError with a message for the user."""
+        scale = self.scale_var.get().strip().rstrip("pP")
+        try:
+            start = parse_time(self.start_entry.get())
+            end = parse_time(self.end_entry.get())
+            scale = int(scale) if scale else None
+        except ValueError:
+            raise ValueError("Trim times look like 90, 1:30 or 1:02:03; the size is a number of pixels.")
+        rotate = self.rotate_var.get()
+        rotate = rotate if rotate == AUTO else int(rotate)
+        return validate(Transform(rotate, self.flip_var.get() or None, scale, start, end))
+
+    def tuning(self):
+        """(target_speed, max_mbps) for adaptive encoding, None for the fixed encoder; raises ValueError."""
+        if not self.adaptive_var.get():
+            return None
+        speed = self.speed_entry.get().strip()
+        mbps = self.mbps_entry.get().strip()
+        return (float(speed) if speed else None), (float(mbps) if mbps else None)
+
+    def add_files(self):
+        ffmpeg_path = self.ffmpeg_path()
+        if not ffmpeg_path:
+            return
+
+        # Ask user to pick videos
+        input_paths = filedialog.askopenfilenames(
+            title="Select video files",
+            filetypes=[("Video files", "*.mp4;*.mov;*.mkv;*.avi;*.flv;*.wmv")]
+        )
+        self.enqueue(ffmpeg_path, input_paths)
+
+    def add_folder(self):
+        ffmpeg_path = self.ffmpeg_path()
+        if not ffmpeg_path:
+            return
+
+        folder = filedialog.askdirectory(title="Select a folder of videos")
+        if not folder:
+            return  # user cancelled
+        input_paths = list(find_videos(folder))
+        if not input_paths:
+            messagebox.showinfo("No Videos", "No video files found in that folder.")
+            return
+        self.enqueue(ffmpeg_path, input_paths)
+
+    def enqueue(self, ffmpeg_path, input_paths):
+        try:
+            transform = self.transform()
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        if transform.rotate == AUTO and self.method_var.get() == "metadata":
+            messagebox.showerror("Error", "Auto upright rewrites the frames; choose a re-encode method.")
+            return
+        try:
+            tuning = self.tuning()
+        except ValueError:
+            messagebox.showerror("Error", "Speed and bitrate must be numbers.")
+            return
+        for input_path in input_paths:
+            self.scheduler.add(Job(ffmpeg_path, input_path, transform, self.method_var.get(), tuning=tuning))
+
+    def cancel_selected(self):
+        selected = {int(item) for item in self.job_list.selection()}
+        self.scheduler.cancel([job for job in self.scheduler.jobs if job.id in selected])
+
+    def update_concurrency(self):
+        try:
+            self.scheduler.set_concurrency(int(self.concurrency_var.get()))
+        except (tk.TclError, ValueError):
+            pass
+
+    def poll_updates(self):
+        """Apply job updates from the worker threads, then reschedule."""
+        try:
+            while True:
+                self.show_job(self.updates.get_nowait())
+        except queue.Empty:
+            pass
+        self.update_concurrency()
+        self.root.after(200, self.poll_updates)
+
+    def show_job(self, job):
+        state = job.state
+        if job.state in ("failed", "skipped"):
+            state = f"{job.state}: {job.error}"
+        elif job.state == "done":
+            state = f"done ({format_time(job.elapsed)})"
+        method = job.method
+        if job.encoder is not None and job.method != "metadata":
+            method = f"{job.method} ({job.encoder.preset or job.encoder.codec}/{job.encoder.crf})"
+        values = (describe_transform(job.transform), method, state, format_progress(job))
+        item = str(job.id)
+        if self.job_list.exists(item):
+            self.job_list.item(item, values=values)
+        else:
+            self.job_list.insert("", tk.END, iid=item, text=job.name, values=values)
+
+        counts = self.scheduler.counts()
+        self.status_label.config(text=" · ".join(f"{count} {state}" for state, count in counts.items() if count))
+        self.progress_bar["value"] = overall_fraction(self.scheduler.jobs)
+
+
+def format_time(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+
+def format_progress(job):
+    """Progress column text, e.g. '42% · 3.1x · ETA 1:20'."""
+    report = job.progress
+    if report is None:
+        return ""
+    if job.state == "done":
+        return f"{report.speed:.1f}x" if report.speed else ""
+    if job.state != "running":
+        return ""
+    parts = [f"{report.fraction:.0%}" if report.fraction is not None else format_time(report.out_time)]
+    if report.speed:
+        parts.append(f"{report.speed:.1f}x")
+    if report.eta is not None:
+        parts.append(f"ETA {format_time(report.eta)}")
+    return " · ".join(parts)
+
+
+def overall_fraction(jobs):
+    """Share of the non-cancelled jobs that is finished, counting running jobs by their progress."""
+    jobs = [job for job in jobs if job.state != "cancelled"]
+    if not jobs:
+        return 0.0
+    done = 0.0
+    for job in jobs:
+        if job.state in ("done", "skipped", "failed"):
+            done += 1
+        elif job.state == "running" and job.progress and job.progress.fraction is not None:
+            done += job.progress.fraction
+    return done / len(jobs)
+
+
+def main():
+    root = tk.Tk()
+    RotatorApp(root)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
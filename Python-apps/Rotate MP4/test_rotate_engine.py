@@ -0,0 +1,51 @@
+"""Run with: python -m pytest"""
+import os
+
+import pytest
+
+from rotate_engine import find_videos, needs_work, rotate_metadata
+from transforms import AUTO, Transform, source_bases
+
+# No ffmpeg or ffprobe here, so every probe fails
+MISSING_FFMPEG = os.path.join(os.sep, "nonexistent", "ffmpeg")
+
+
+def names(paths):
+    return sorted(os.path.basename(path) for path in paths)
+
+
+def test_source_bases_strip_one_token_at_a_time():
+    assert list(source_bases("trip_90cw_cut")) == ["trip_90cw", "trip"]
+    assert list(source_bases("holiday")) == []
+    assert list(source_bases("VID_20240101_180")) == ["VID_20240101"]
+
+
+def test_sources_that_look_like_outputs_are_kept(tmp_path):
+    sources = ["VID_20240101_180.mp4", "IMG_270.mp4", "party_cut.mp4", "trip_flip.mp4", "holiday_1080p.mov"]
+    for name in sources:
+        (tmp_path / name).touch()
+    assert names(find_videos(str(tmp_path))) == sorted(sources)
+
+
+def test_outputs_next_to_their_source_are_skipped(tmp_path):
+    for name in ["clip.mp4", "clip_90cw.mp4", "clip_90cw_720p_cut.mp4", "clip_1080p.mp4", "clip_upright.mov",
+                 ".clip_90cw.partial.mp4", "notes.txt"]:
+        (tmp_path / name).touch()
+    # clip_upright.mov has no clip.mov next to it, so it is a source
+    assert names(find_videos(str(tmp_path))) == ["clip.mp4", "clip_upright.mov"]
+
+
+def test_auto_upright_fails_when_ffprobe_cannot_read(tmp_path):
+    video = tmp_path / "clip.mp4"
+    video.touch()
+    with pytest.raises(ValueError, match="ffprobe could not read"):
+        needs_work(MISSING_FFMPEG, str(video), Transform(rotate=AUTO))
+    assert needs_work(MISSING_FFMPEG, str(video), Transform(rotate=90))
+
+
+def test_metadata_rotation_refuses_unknown_rotation(tmp_path):
+    video = tmp_path / "clip.mp4"
+    video.touch()
+    with pytest.raises(ValueError, match="current rotation is unknown"):
+        rotate_metadata(MISSING_FFMPEG, str(video), "90")
+    assert os.listdir(tmp_path) == ["clip.mp4"]
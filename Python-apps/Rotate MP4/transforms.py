@@ -0,0 +1,179 @@
+"""Composable video transforms: rotate, flip, downscale and trim in one ffmpeg pass.
+
+A Transform compiles to a single video filter chain plus input-side seek
+options, so any combination costs one decode and one encode.
+"""
+import re
+from collections import namedtuple
+
+# rotate: clockwise degrees (0, 90, 180, 270) or AUTO, applied first
+# flip:   None, "h" (mirror) or "v" (upside down), applied after the rotation
+# scale:  target length of the short side in pixels; only ever downscales
+# start, end: trim points in seconds of the source (None: from the start / to the end)
+Transform = namedtuple("Transform", "rotate flip scale start end", defaults=(0, None, None, None, None))
+
+# Turn each file upright from its own display matrix / rotate tag. ffmpeg
+# applies that turn while decoding (autorotation) and writes the output
+# without the matrix, so the filter chain only has to add the flip.
+AUTO = "auto"
+
+# The four classic modes
+MODES = {
+    "90": Transform(rotate=90),
+    "180": Transform(rotate=180),
+    "270": Transform(rotate=270),
+    "flip": Transform(flip="h"),
+}
+
+# Rotation then flip folded into the cheapest filter: transpose=1 turns
+# clockwise, 2 counter-clockwise, 0 and 3 are those turns plus a vertical
+# flip. Half turns are a mirror in both directions, no transpose needed.
+ORIENT_FILTERS = {
+    (0, None): None,
+    (0, "h"): "hflip",
+    (0, "v"): "vflip",
+    (90, None): "transpose=1",
+    (90, "h"): "transpose=0",
+    (90, "v"): "transpose=3",
+    (180, None): "hflip,vflip",
+    (180, "h"): "vflip",
+    (180, "v"): "hflip",
+    (270, None): "transpose=2",
+    (270, "h"): "transpose=3",
+    (270, "v"): "transpose=0",
+}
+
+ROTATION_SUFFIXES = {90: "90cw", 180: "180", 270: "270", AUTO: "upright"}
+FLIP_SUFFIXES = {"h": "flip", "v": "vflip"}
+
+# Output name suffix made only of transform tokens, e.g. _90cw_720p_cut
+SUFFIX_TOKEN = re.compile(r"^(90cw|180|270|upright|flip|vflip|\d+p|cut)$")
+
+
+def as_transform(mode):
+    """A Transform for a mode name from MODES, or mode itself if it already is one."""
+    if isinstance(mode, Transform):
+        return mode
+    try:
+        return MODES[mode]
+    except KeyError:
+        raise ValueError(f"Unknown mode '{mode}': choose from {', '.join(MODES)}")
+
+
+def validate(transform):
+    """Raise ValueError for a transform that does nothing or can't be compiled."""
+    if (orientation(transform), transform.flip) not in ORIENT_FILTERS:
+        raise ValueError(f"Unsupported rotation/flip: {transform.rotate}°, {transform.flip}")
+    if transform.scale is not None and transform.scale < 2:
+        raise ValueError("Scale must be at least 2 pixels.")
+    if transform.start is not None and transform.start < 0:
+        raise ValueError("Trim start can't be negative.")
+    if transform.end is not None and transform.end <= (transform.start or 0):
+        raise ValueError("Trim end must come after its start.")
+    if transform == Transform():
+        raise ValueError("Nothing to do: choose a rotation, flip, scale or trim.")
+    return transform
+
+
+def orientation(transform):
+    """The rotation the filter chain applies: none for AUTO, which ffmpeg handles while decoding."""
+    return 0 if transform.rotate == AUTO else transform.rotate
+
+
+def is_trimmed(transform):
+    return transform.start is not None or transform.end is not None
+
+
+def video_filter(transform):
+    """The filter chain for the video stream; scaling comes first so fewer pixels get rotated."""
+    filters = []
+    if transform.scale:
+        # The short side is the same before and after a quarter turn; keep sizes even for 4:2:0
+        short = f"trunc(min({transform.scale},{{}})/2)*2"
+        filters.append(f"scale=w='if(gte(iw,ih),-2,{short.format('iw')})'"
+                       f":h='if(gte(iw,ih),{short.format('ih')},-2)'")
+    orient = ORIENT_FILTERS[orientation(transform), transform.flip]
+    if orient:
+        filters.append(orient)
+    return ",".join(filters) or "null"
+
+
+def input_args(transform):
+    """Input-side seek options for a trim, placed before -i so ffmpeg skips instead of decoding."""
+    args = []
+    if transform.start:
+        args += ["-ss", f"{transform.start:.3f}"]
+    if transform.end is not None:
+        args += ["-t", f"{transform.end - (transform.start or 0):.3f}"]
+    return args
+
+
+def output_duration(transform, duration):
+    """Length of the output in seconds for a source of `duration` (None if unknown)."""
+    end = transform.end if transform.end is not None else duration
+    if end is None:
+        return None
+    if duration is not None:
+        end = min(end, duration)
+    return max(0.0, end - (transform.start or 0))
+
+
+def suffix(transform):
+    """Output file suffix, e.g. _90cw, _flip or _270_vflip_720p_cut."""
+    tokens = [ROTATION_SUFFIXES.get(transform.rotate), FLIP_SUFFIXES.get(transform.flip)]
+    if transform.scale:
+        tokens.append(f"{transform.scale}p")
+    if is_trimmed(transform):
+        tokens.append("cut")
+    return "".join("_" + token for token in tokens if token)
+
+
+def source_bases(base):
+    """File names (without extension) that suffix() could have turned into base,
+    shortest suffix first: 'trip_90cw_cut' gives 'trip_90cw', then 'trip'.
+
+    Tokens alone can't tell an output from a source such as IMG_270 or
+    party_cut, so a name only counts as an output when one of these sits
+    next to it.
+    """
+    parts = base.split("_")
+    for start in range(len(parts) - 1, 0, -1):
+        if not SUFFIX_TOKEN.match(parts[start]):
+            break
+        yield "_".join(parts[:start])
+
+
+def describe(transform):
+    """Short text for the job list, e.g. '90° cw · mirror · 720p · 0:10-1:30'."""
+    parts = []
+    if transform.rotate:
+        parts.append({90: "90° cw", 180: "180°", 270: "90° ccw", AUTO: "upright"}[transform.rotate])
+    if transform.flip:
+        parts.append("mirror" if transform.flip == "h" else "upside down")
+    if transform.scale:
+        parts.append(f"{transform.scale}p")
+    if is_trimmed(transform):
+        end = format_position(transform.end) if transform.end is not None else "end"
+        parts.append(f"{format_position(transform.start or 0)}-{end}")
+    return " · ".join(parts)
+
+
+def parse_time(text):
+    """Seconds from '90', '1:30', '1:02:03.5'; None for an empty field. Raises ValueError."""
+    text = text.strip()
+    if not text:
+        return None
+    seconds = 0.0
+    for part in text.split(":"):
+        seconds = seconds * 60 + float(part)
+    if seconds < 0:
+        raise ValueError(f"Invalid time '{text}'")
+    return seconds
+
+
+def format_position(seconds):
+    """'1:30', '1:02:03' or '0:07.5' for a trim point."""
+    minutes, seconds = divmod(round(seconds, 1), 60)
+    hours, minutes = divmod(int(minutes), 60)
+    seconds = f"{seconds:04.1f}" if seconds % 1 else f"{int(seconds):02d}"
+    return f"{hours}:{minutes:02d}:{seconds}" if hours else f"{minutes}:{seconds}"